@@ -0,0 +1,128 @@
+"""
+Graph families for the benchmarks. Every family maps a size parameter to a
+list of `(name, edge_index, precolor)` instances; `FAMILIES` lists them
+with their default sizes.
+"""
+import numpy as np
+from itertools import permutations
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from isoutils.furer import get_furer_graph_pair_with_precolor
+
+Instance = Tuple[str, np.ndarray, Optional[np.ndarray]]
+
+# Base graphs of the figures of the SWL paper (see `examples.py`).
+FIGURES = {
+    4: [[0, 1, 1, 2, 2, 0, 1, 3, 2, 3, 3, 4, 4, 5, 3, 5, 4, 6, 5, 6],
+        [1, 0, 2, 1, 0, 2, 3, 1, 3, 2, 4, 3, 5, 4, 5, 3, 6, 4, 6, 5]],
+    5: [[0, 1, 1, 2, 2, 0, 0, 3, 0, 4, 3, 4, 3, 7, 4, 7, 5, 6, 6, 7, 5, 7],
+        [1, 0, 2, 1, 0, 2, 3, 0, 4, 0, 4, 3, 7, 3, 7, 4, 6, 5, 7, 6, 7, 5]],
+    6: [[0, 1, 1, 2, 2, 0, 1, 3, 2, 3, 3, 4, 4, 5, 5, 3, 5, 6, 6, 7, 7, 5,
+         6, 8, 7, 8],
+        [1, 0, 2, 1, 0, 2, 3, 1, 3, 2, 4, 3, 5, 4, 3, 5, 6, 5, 7, 6, 5, 7,
+         8, 6, 8, 7]],
+    7: [[0, 1, 0, 2, 1, 3, 2, 3, 2, 4, 4, 5, 5, 3, 4, 6, 6, 7, 7, 5],
+        [1, 0, 2, 0, 3, 1, 3, 2, 4, 2, 5, 4, 3, 5, 6, 4, 7, 6, 5, 7]],
+    8: [[0, 1, 1, 2, 2, 0, 1, 3, 3, 4, 4, 1, 2, 4, 4, 5, 5, 2],
+        [1, 0, 2, 1, 0, 2, 3, 1, 4, 3, 1, 4, 4, 2, 5, 4, 2, 5]],
+    9: [[0, 1, 1, 3, 3, 5, 5, 4, 4, 2, 2, 0, 0, 6, 6, 4, 1, 7, 7, 5],
+        [1, 0, 3, 1, 5, 3, 4, 5, 2, 4, 0, 2, 6, 0, 4, 6, 7, 1, 5, 7]],
+    10: [[0, 3, 3, 1, 1, 7, 7, 2, 2, 5, 5, 0, 0, 4, 4, 1, 1, 8, 8, 2, 2, 6,
+          6, 0],
+         [3, 0, 1, 3, 7, 1, 2, 7, 5, 2, 0, 5, 4, 0, 1, 4, 8, 1, 2, 8, 6, 2,
+          0, 6]],
+    11: [[0, 2, 2, 5, 5, 7, 7, 8, 8, 11, 11, 14, 14, 12, 12, 9, 9, 7, 7, 6,
+          6, 3, 3, 0, 0, 1, 1, 5, 8, 10, 10, 14, 14, 13, 13, 9, 0, 4, 4, 6],
+         [2, 0, 5, 2, 7, 5, 8, 7, 11, 8, 14, 11, 12, 14, 9, 12, 7, 9, 6, 7,
+          3, 6, 0, 3, 1, 0, 5, 1, 10, 8, 14, 10, 13, 14, 9, 13, 4, 0, 6, 4]],
+}
+
+def from_pairs(pairs) -> np.ndarray:
+    """
+    Symmetric sparse adjacency matrix of the undirected edges `pairs`.
+    """
+    pairs = np.array(sorted(set(pairs)), dtype=np.int64).reshape(-1, 2).T
+    return np.concatenate([pairs, pairs[::-1]], axis=1)
+
+def clique(k: int) -> np.ndarray:
+    return np.array(list(permutations(range(k), 2)), dtype=np.int64).T
+
+def furer_pair(base: np.ndarray, name: str) -> List[Instance]:
+    G, H, G_precolor, H_precolor = get_furer_graph_pair_with_precolor(base)
+    return [(f'{name}/G', G, G_precolor), (f'{name}/H', H, H_precolor)]
+
+def furer_cliques(k: int) -> List[Instance]:
+    return furer_pair(clique(k), f'K{k}')
+
+def furer_figures(figure: int) -> List[Instance]:
+    return furer_pair(np.array(FIGURES[figure], dtype=np.int64),
+                      f'figure {figure}')
+
+def rook_shrikhande(m: int) -> List[Instance]:
+    """
+    The m x m rook's graph, and the Cayley graph of Z_m x Z_m generated by
+    (1, 0), (0, 1) and (1, 1), which is the Shrikhande graph for m = 4.
+    """
+    rook, cayley = [], []
+    for (i, j) in np.ndindex(m, m):
+        for k in range(m):
+            rook += [(i * m + j, i * m + k), (i * m + j, k * m + j)]
+        for (di, dj) in ((1, 0), (0, 1), (1, 1)):
+            cayley.append((i * m + j, (i + di) % m * m + (j + dj) % m))
+    rook = [(a, b) for (a, b) in rook if a != b]
+    cayley = [tuple(sorted(edge)) for edge in cayley if edge[0] != edge[1]]
+    return [(f'rook {m}', from_pairs(tuple(sorted(edge)) for edge in rook),
+             None),
+            (f'shrikhande {m}', from_pairs(cayley), None)]
+
+def random_regular(n: int, degree: int = 3, seed: int = 0) -> List[Instance]:
+    """
+    Two random `degree`-regular graphs on n nodes, by the pairing model with
+    restarts.
+    """
+    rng = np.random.default_rng(seed + n)
+    instances = []
+    while len(instances) < 2:
+        stubs = rng.permutation(np.repeat(np.arange(n), degree))
+        pairs = stubs.reshape(-1, 2)
+        edges = {tuple(sorted(pair)) for pair in pairs.tolist()}
+        if np.all(pairs[:, 0] != pairs[:, 1]) and len(edges) == len(pairs):
+            instances.append((f'regular {n}/{len(instances)}',
+                              from_pairs(edges), None))
+    return instances
+
+def box_composition(copies: int, k: int = 3) -> List[Instance]:
+    """
+    The box graphs of `examples.py`, with `copies` Furer graphs of the
+    k-clique each joined to a hub, and hubs on a cycle. The two instances
+    alternate the Furer graphs (G, H, G, H, ...) or put them in two halves
+    (G, ..., G, H, ..., H).
+    """
+    G, H, _, _ = get_furer_graph_pair_with_precolor(clique(k))
+    size = int(max(G.max(), H.max())) + 1
+    hubs = copies * size
+    instances = []
+    for (name, twisted) in (('alternating', [i % 2 == 1
+                                             for i in range(copies)]),
+                            ('halves', [2 * i >= copies
+                                        for i in range(copies)])):
+        parts = []
+        for (i, twist) in enumerate(twisted):
+            parts.append((H if twist else G) + i * size)
+            nodes = np.arange(i * size, (i + 1) * size, dtype=np.int64)
+            hub = np.full((size, ), hubs + i, dtype=np.int64)
+            parts += [np.stack([nodes, hub]), np.stack([hub, nodes])]
+        ring = [(hubs + i, hubs + (i + 1) % copies) for i in range(copies)]
+        parts.append(from_pairs(tuple(sorted(edge)) for edge in ring
+                                if edge[0] != edge[1]))
+        precolor = np.array([0] * hubs + [1] * copies, dtype=np.int64)
+        instances.append((f'box {copies}x K{k}/{name}',
+                          np.concatenate(parts, axis=1), precolor))
+    return instances
+
+FAMILIES: Dict[str, Tuple[Callable[[int], List[Instance]], Sequence[int]]] = {
+    'furer_cliques': (furer_cliques, (3, 4, 5, 6)),
+    'furer_figures': (furer_figures, tuple(FIGURES)),
+    'rook_shrikhande': (rook_shrikhande, (3, 4, 5, 6)),
+    'random_regular': (random_regular, (8, 12, 16, 24, 32)),
+    'box_composition': (box_composition, (2, 4, 6)),
+}
@@ -0,0 +1,112 @@
+"""
+Benchmark every registered method on the graph families of
+`benchmarks.graphs`, across growing sizes.
+
+For each method and graph, the time of `set_graph`, `initialize_colors`,
+`get_stable_coloring` and `pool_colors` are recorded, together with the
+time to build the graphs. Refinement runs through `get_stable_coloring`,
+so that engines with their own rounds (e.g. `incremental` WL2 or the
+`hopcroft` engine of WL1) are measured; the time of every round and of
+every section (see `WLProfile`) is taken from a profile of that call. Once a method exceeds `--budget` seconds
+on a graph, larger sizes of the family are skipped for it.
+
+Results are written as JSON to `--output`, so that runs of different
+engines (see `--kwargs`) can be compared.
+
+Run from the repository root:
+    python -m benchmarks.scaling
+    python -m benchmarks.scaling --method FWL2 --family furer_cliques \\
+        --kwargs '{"engine": "loop"}' --output loop.json
+"""
+import argparse
+import json
+import platform
+import time
+import numpy as np
+from typing import Any, Dict, List, Optional
+from isoutils.comparer import METHODS, method_resolve
+from isoutils.wl import WLProfile
+from .graphs import FAMILIES
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def bench(method: str, graph: np.ndarray, precolor: Optional[np.ndarray],
+          kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    solver = method_resolve(method)(**kwargs)
+    record: Dict[str, Any] = {}
+    _, record['set_graph'] = timed(solver.set_graph, graph, 'sparse')
+    if method != 'WL1':
+        _, record['initialize_colors'] = timed(
+            solver.initialize_colors, identity=True, precolor=precolor
+        )
+    else:
+        _, record['initialize_colors'] = timed(
+            solver.initialize_colors, precolor=precolor
+        )
+
+    solver.profile = WLProfile()
+    coloring, record['stable_coloring'] = timed(solver.get_stable_coloring)
+    record['rounds'] = [call['seconds'] for call in solver.profile.rounds]
+    record['sections'] = solver.profile.sections
+    solver.profile = None
+    _, record['pool_colors'] = timed(solver.pool_colors, coloring)
+    record['num_colors'] = int(np.unique(solver.color).shape[0])
+    record['total'] = record['set_graph'] + record['initialize_colors'] + \
+        record['stable_coloring'] + record['pool_colors']
+    return record
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--method', nargs='+', default=list(METHODS))
+    parser.add_argument('--family', nargs='+', default=list(FAMILIES))
+    parser.add_argument('--sizes', nargs='+', type=int, default=None,
+                        help='sizes of every family (default: per family)')
+    parser.add_argument('--kwargs', type=json.loads, default={},
+                        help='JSON keyword arguments of the solvers')
+    parser.add_argument('--budget', type=float, default=10.,
+                        help='seconds per graph before larger sizes '
+                             'are skipped')
+    parser.add_argument('--output', default='scaling.json')
+    args = parser.parse_args(argv)
+
+    results: List[Dict[str, Any]] = []
+    for family in args.family:
+        build, default_sizes = FAMILIES[family]
+        over_budget = set()
+        for size in args.sizes or default_sizes:
+            instances, elapsed = timed(build, size)
+            results.append({'family': family, 'size': size, 'method': None,
+                            'graph': None, 'build': elapsed})
+            for method in args.method:
+                if method in over_budget:
+                    continue
+                for (name, graph, precolor) in instances:
+                    try:
+                        record = bench(method, graph, precolor, args.kwargs)
+                    except (TypeError, ValueError, RuntimeError) as e:
+                        # e.g. an engine the method does not have.
+                        print(f"{method}: {e!r}")
+                        over_budget.add(method)
+                        break
+                    record.update(
+                        family=family, size=size, method=method, graph=name,
+                        num_nodes=int(graph.max(initial=-1)) + 1,
+                        num_edges=int(graph.shape[1])
+                    )
+                    results.append(record)
+                    print(f"{family:<16}{size:>4} {name:<28}{method:<12}"
+                          f"{len(record['rounds']):>3} rounds "
+                          f"{record['total']:9.3f}s")
+                    if record['total'] > args.budget:
+                        over_budget.add(method)
+
+    with open(args.output, 'w') as f:
+        json.dump({'python': platform.python_version(),
+                   'numpy': np.__version__, 'platform': platform.platform(),
+                   'kwargs': args.kwargs, 'results': results}, f, indent=1)
+
+if __name__ == '__main__':
+    main()
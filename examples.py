@@ -1,6 +1,10 @@
 import numpy as np
 from isoutils.furer import get_furer_graph_pair_with_precolor
 from isoutils.comparer import wl_test
+from isoutils.utils import RepresentationCache
+
+# Representations are cached on disk, so re-running only costs lookups.
+cache = RepresentationCache()
 
 name = ['3-clique', # sanity check
         '4-clique', # sanity check
@@ -90,7 +94,7 @@ for method in [
     #                 'GSWL_SV_P', 'GSWL_VS_P', 'SSWL_SV', 'SSWL_VS',
     #                 'FullSWL_SV', 'FullSWL_VS', 
                     'I2WL', 'N2FWL']:
-    print(f"{method} {'can' if wl_test(method, G, H, G_precolor, H_precolor) else 'cannot'} discriminate b/w G & H.")
+    print(f"{method} {'can' if wl_test(method, G, H, G_precolor, H_precolor, cache=cache) else 'cannot'} discriminate b/w G & H.")
 
 
 for n, base in zip(name, base_graph):
@@ -106,5 +110,6 @@ for n, base in zip(name, base_graph):
         #                 'FullSWL_SV', 'FullSWL_VS', 
                         'I2WL', 'N2FWL']:
         # print(f"{method} {'can' if wl_test(method, G, H, G_precolor, H_precolor) else 'cannot'} discriminate b/w G & H.")
-        print(f"{method} {'can' if wl_test(method, G, H) else 'cannot'} discriminate b/w G & H.")
+        print(f"{method} {'can' if wl_test(method, G, H, cache=cache) else 'cannot'} discriminate b/w G & H.")
 
+print(f"Cache: {cache.stats()}")
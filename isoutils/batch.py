@@ -0,0 +1,177 @@
+"""
+Batch runner, see `main()`. Run as `python -m isoutils`.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Literal, Optional, Sequence, TextIO
+from .comparer import METHODS, submit_bounded, time_limit, wl_test
+from .furer import get_furer_graph_pair_with_precolor
+from .utils import decode_graph6
+
+def read_records(streams: Iterable[TextIO],
+                 format: Literal['jsonl', 'graph6'] = 'jsonl'
+                 ) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the records of JSONL streams, one per non-empty line. Records
+    without an `id` get their position in the input as `id`; lines which
+    are not JSON objects yield a record with `error` set. With
+    `format='graph6'`, every line is a base graph in graph6 or sparse6
+    format instead, which is decoded by the worker.
+    """
+    index = 0
+    for stream in streams:
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            if format == 'graph6':
+                yield {'id': index, 'graph6': line}
+                index += 1
+                continue
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError('Expected a JSON object')
+            except ValueError as e:
+                record = {'error': f"{type(e).__name__}: {e}"}
+            record.setdefault('id', index)
+            index += 1
+            yield record
+
+def open_inputs(paths: Iterable[str]) -> Iterator[TextIO]:
+    """
+    Open the files `paths` one at a time, `-` being stdin.
+    """
+    for path in paths:
+        if path == '-':
+            yield sys.stdin
+        else:
+            with open(path) as f:
+                yield f
+
+def build_pair(record: Dict[str, Any]) -> tuple:
+    """
+    Return `(G, H, G_precolor, H_precolor)` for a record, which holds either
+    a `base` graph, whose Furer graphs are compared, or graphs `G` and `H`
+    with optional `G_precolor` and `H_precolor`. Graphs are sparse adjacency
+    matrices, as nested lists of shape 2 * m, which list both directions of
+    undirected edges. A base graph may also be given as `graph6` string.
+    """
+    if 'graph6' in record:
+        base = decode_graph6(record['graph6']).to_sparse_adj()
+        return get_furer_graph_pair_with_precolor(base)
+    if 'base' in record:
+        base = np.array(record['base'], dtype=np.int64).reshape(2, -1)
+        return get_furer_graph_pair_with_precolor(base)
+    G = np.array(record['G'], dtype=np.int64).reshape(2, -1)
+    H = np.array(record['H'], dtype=np.int64).reshape(2, -1)
+    precolors = [None if record.get(key) is None
+                 else np.array(record[key], dtype=np.int64)
+                 for key in ('G_precolor', 'H_precolor')]
+    return (G, H, *precolors)
+
+def run_record(record: Dict[str, Any], methods: Sequence[str],
+               timeout: Optional[float], kwargs: dict) -> List[Dict[str, Any]]:
+    """
+    Test the pair of `record` with every method, and return one result per
+    method: `{'id', 'method', 'result', 'error', 'seconds'}`, where `result`
+    tells whether the method distinguishes the pair. Errors, including
+    timeouts after `timeout` seconds per method, are reported in `error`.
+    """
+    def result(method: Optional[str], value: Optional[bool] = None,
+               error: Optional[str] = None, seconds: float = 0.):
+        return {'id': record['id'], 'method': method, 'result': value,
+                'error': error, 'seconds': seconds}
+
+    if 'error' in record:
+        return [result(None, error=record['error'])]
+    start = time.perf_counter()
+    try:
+        pair = build_pair(record)
+    except Exception as e:
+        return [result(None, error=f"{type(e).__name__}: {e}")]
+    build = time.perf_counter() - start
+
+    results = []
+    for method in methods:
+        start = time.perf_counter()
+        try:
+            with time_limit(timeout):
+                value = bool(wl_test(method, *pair, **kwargs))
+            results.append(result(method, value))
+        except TimeoutError:
+            results.append(result(method, error=f"Timed out after {timeout} "
+                                                f"seconds"))
+        except Exception as e:
+            results.append(result(method, error=f"{type(e).__name__}: {e}"))
+        results[-1]['seconds'] = time.perf_counter() - start
+    if 'base' in record or 'graph6' in record:
+        for r in results:
+            r['build_seconds'] = build
+    return results
+
+def run_stream(records: Iterable[Dict[str, Any]], methods: Sequence[str],
+               workers: int = 0, timeout: Optional[float] = None,
+               **kwargs) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the results of `run_record()` for a stream of records, in order
+    of completion. Records are read lazily and spread over `workers`
+    processes, which are started once, with at most two records per worker
+    pending at any time. With `workers=0`, records are run in this process,
+    in order.
+    """
+    if workers == 0:
+        for record in records:
+            yield from run_record(record, methods, timeout, kwargs)
+        return
+
+    with ProcessPoolExecutor(workers) as executor:
+        for (_, future) in submit_bounded(
+            executor, run_record,
+            ((record, methods, timeout, kwargs) for record in records),
+            workers
+        ):
+            yield from future.result()
+
+def main(argv: Optional[List[str]] = None):
+    """
+    Read graph pairs as JSONL from files (or stdin) and write one JSONL
+    result per pair and method to stdout, see `build_pair()` and
+    `run_record()`, e.g.
+
+        echo '{"id": "K4", "base": [[0, 1, 0, 2, 0, 3, 1, 2, 1, 3, 2, 3], [1, 0, 2, 0, 3, 0, 2, 1, 3, 1, 3, 2]]}' \\
+            | python -m isoutils --method SSWL_SV FWL2
+    """
+    parser = argparse.ArgumentParser(
+        prog='python -m isoutils',
+        description='Run WL tests on a stream of graph pairs.'
+    )
+    parser.add_argument('inputs', nargs='*', default=['-'],
+                        help='files of pairs, "-" for stdin')
+    parser.add_argument('--format', choices=['jsonl', 'graph6'],
+                        default='jsonl',
+                        help='JSONL pairs, or graph6/sparse6 base graphs')
+    parser.add_argument('--method', nargs='+', default=list(METHODS))
+    parser.add_argument('--workers', type=int, default=0,
+                        help='worker processes, -1 for all cores '
+                             '(default: run in this process)')
+    parser.add_argument('--timeout', type=float, default=None,
+                        help='seconds per method and pair')
+    parser.add_argument('--joint', action='store_true',
+                        help='refine both graphs jointly (see wl_test)')
+    parser.add_argument('--kwargs', type=json.loads, default={},
+                        help='JSON keyword arguments of the solvers')
+    args = parser.parse_args(argv)
+
+    workers = (os.cpu_count() or 1) if args.workers < 0 else args.workers
+    results = run_stream(read_records(open_inputs(args.inputs), args.format),
+                         args.method, workers,
+                         args.timeout, joint=args.joint, **args.kwargs)
+    for result in results:
+        sys.stdout.write(json.dumps(result) + '\n')
+        sys.stdout.flush()
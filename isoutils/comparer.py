@@ -1,32 +1,306 @@
 import numpy as np
+import os
+import signal
+import threading
+from contextlib import contextmanager
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, FIRST_COMPLETED, wait
 from .wl import *
-from typing import Optional, Callable
+from .utils import SharedColorTable, HashRelabel, RepresentationCache, Representation, CSRAdj, fingerprint
+from typing import Dict, Iterable, List, Optional, Callable, Iterator, NamedTuple, Sequence, Tuple, Union
+
+METHODS = ('WL2', 'FWL2', 'LFWL', 'SLFWL', 'SWL_SV', 'SWL_VS',
+           'SWL_SV_P', 'SWL_VS_P', 'SWL_SV_G', 'SWL_VS_G',
+           'PSWL_SV', 'PSWL_VS', 'GSWL_SV', 'GSWL_VS',
+           'GSWL_SV_P', 'GSWL_VS_P', 'SSWL_SV', 'SSWL_VS',
+           'FullSWL_SV', 'FullSWL_VS', 'WL1', 'I2WL', 'N2FWL')
 
 def method_resolve(method: str) -> Callable:
-    assert method in {'WL2', 'FWL2', 'LFWL', 'SLFWL', 'SWL_SV', 'SWL_VS',
-                      'SWL_SV_P', 'SWL_VS_P', 'SWL_SV_G', 'SWL_VS_G',
-                      'PSWL_SV', 'PSWL_VS', 'GSWL_SV', 'GSWL_VS',
-                      'GSWL_SV_P', 'GSWL_VS_P', 'SSWL_SV', 'SSWL_VS',
-                      'FullSWL_SV', 'FullSWL_VS', 'WL1', 'I2WL', 'N2FWL'}, "Invalid method!"
-    return eval(method)
+    assert method in METHOD_REGISTRY, "Invalid method!"
+    return METHOD_REGISTRY[method]
 
-def wl_test(method: str, G: np.ndarray, H: np.ndarray,
-            G_precolor: Optional[np.ndarray] = None, 
-            H_precolor: Optional[np.ndarray] = None) -> bool:
-    solver: BaseWL = method_resolve(method)()
-    solver.set_graph(G, 'sparse')
+def initialize_solver(method: str, solver: BaseWL,
+                      graph: Union[np.ndarray, CSRAdj],
+                      precolor: Optional[np.ndarray] = None):
+    solver.set_graph(graph, 'adj' if isinstance(graph, CSRAdj) else 'sparse')
     if method != 'WL1':
-        solver.initialize_colors(identity=True, precolor=G_precolor)
+        solver.initialize_colors(identity=True, precolor=precolor)
     else:
-        solver.initialize_colors(precolor=G_precolor)
-    G_multiset = solver.representation()
+        solver.initialize_colors(precolor=precolor)
 
-    solver.set_graph(H, 'sparse')
-    if method != 'WL1':
-        solver.initialize_colors(identity=True, precolor=H_precolor)
-    else:
-        solver.initialize_colors(precolor=H_precolor)
-    H_multiset = solver.representation()
+def wl_representation(method: str, G: np.ndarray,
+                      G_precolor: Optional[np.ndarray] = None,
+                      cache: Optional[RepresentationCache] = None,
+                      **kwargs) -> Representation:
+    """
+    Return the representation of G under `method`. If `cache` is given, the
+    representation is looked up there first, and stored there if missing.
+    """
+    if cache is not None:
+        key = cache.key(method, G, G_precolor, identity=method != 'WL1',
+                        **kwargs)
+        multiset = cache.get(key)
+        if multiset is not None:
+            return multiset
+
+    solver: BaseWL = method_resolve(method)(**kwargs)
+    initialize_solver(method, solver, G, G_precolor)
+    multiset = solver.representation()
+
+    if cache is not None:
+        cache.put(key, multiset)
+    return multiset
+
+def wl_test(method: str, G: np.ndarray, H: np.ndarray,
+            G_precolor: Optional[np.ndarray] = None,
+            H_precolor: Optional[np.ndarray] = None,
+            joint: bool = False,
+            cache: Optional[RepresentationCache] = None, **kwargs) -> bool:
+    """
+    Extra keyword arguments are passed to the solver, e.g.
+    `wl_test('FWL2', G, H, engine='matmul')`.
+
+    Set `joint=True` to refine G and H together (see `wl_test_joint()`).
+    Otherwise, representations are looked up in and stored to `cache` if
+    given (see `RepresentationCache`).
+    """
+    if joint:
+        return wl_test_joint(method, G, H, G_precolor, H_precolor, **kwargs)
 
+    G_multiset = wl_representation(method, G, G_precolor, cache, **kwargs)
+    H_multiset = wl_representation(method, H, H_precolor, cache, **kwargs)
     return G_multiset != H_multiset
 
+def color_histogram(color: np.ndarray) -> np.ndarray:
+    return np.stack(np.unique(color, return_counts=True))
+
+def wl_test_joint(method: str, G: np.ndarray, H: np.ndarray,
+                  G_precolor: Optional[np.ndarray] = None,
+                  H_precolor: Optional[np.ndarray] = None,
+                  **kwargs) -> bool:
+    """
+    Refine G and H round by round with one shared color table, so that
+    colors mean the same in both graphs. Return `True` as soon as the color
+    histograms of G and H differ in some round; otherwise, compare the
+    pooled stable colorings.
+    """
+    table = SharedColorTable()
+    solvers = []
+    for graph, precolor in ((G, G_precolor), (H, H_precolor)):
+        solver: BaseWL = method_resolve(method)(**kwargs)
+        solver.relabel = table
+        initialize_solver(method, solver, graph, precolor)
+        solvers.append(solver)
+    solver_G, solver_H = solvers
+
+    num_colors = np.unique(np.concatenate([solver_G.color,
+                                           solver_H.color])).shape[0]
+    while True:
+        hist_G = color_histogram(solver_G.color)
+        hist_H = color_histogram(solver_H.color)
+        if hist_G.shape != hist_H.shape or np.any(hist_G != hist_H):
+            return True
+
+        table.reset()
+        solver_G.update_colors()
+        solver_H.update_colors()
+        if len(table) == num_colors:
+            break
+        num_colors = len(table)
+
+    return solver_G.pool_colors(solver_G.color) != \
+        solver_H.pool_colors(solver_H.color)
+
+def wl_fingerprint(method: str, G: np.ndarray,
+                   G_precolor: Optional[np.ndarray] = None,
+                   **kwargs) -> str:
+    """
+    Return the fingerprint of the stable coloring of G under `method`, with
+    colors given by `HashRelabel`. Fingerprints are deterministic, so two
+    graphs are distinguished by `method` iff their fingerprints differ, no
+    matter in which run or process either fingerprint was computed.
+    """
+    solver: BaseWL = method_resolve(method)(**kwargs)
+    solver.relabel = HashRelabel()
+    initialize_solver(method, solver, G, G_precolor)
+    return solver.fingerprint()
+
+class WLTestResult(NamedTuple):
+    method: str
+    pair: int
+    result: Optional[bool]
+    error: Optional[str] = None
+
+# Pairs of the current `wl_test_many()` call, shipped to every worker once.
+_pairs: Sequence[Tuple[np.ndarray, ...]] = ()
+
+def _init_worker(pairs: Sequence[Tuple[np.ndarray, ...]]):
+    global _pairs
+    _pairs = pairs
+
+def _raise_timeout(signum, frame):
+    raise TimeoutError()
+
+@contextmanager
+def time_limit(timeout: Optional[float]) -> Iterator[None]:
+    """
+    Raise `TimeoutError` in the code run within the context once it runs
+    longer than `timeout` seconds (never if `None`), by `SIGALRM`. The
+    previous `SIGALRM` handler is restored on exit. Signals are only
+    handled on the main thread, so a timeout elsewhere raises
+    `RuntimeError`.
+    """
+    if timeout is None:
+        yield
+        return
+    if threading.current_thread() is not threading.main_thread():
+        raise RuntimeError('Timeouts are only supported on the main thread!')
+    handler = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, handler)
+
+def _run_job(method: str, pair: int, timeout: Optional[float],
+             kwargs: dict) -> WLTestResult:
+    try:
+        with time_limit(timeout):
+            result = wl_test(method, *_pairs[pair], **kwargs)
+        return WLTestResult(method, pair, result)
+    except TimeoutError:
+        return WLTestResult(method, pair, None,
+                            f"Timed out after {timeout} seconds")
+    except Exception as e:
+        return WLTestResult(method, pair, None, f"{type(e).__name__}: {e}")
+
+def submit_bounded(executor: Executor, fn: Callable, jobs: Iterable[tuple],
+                   workers: int) -> Iterator[Tuple[int, Future]]:
+    """
+    Submit `fn(*job)` to `executor` for every job of the lazy iterable
+    `jobs`, with at most two jobs per worker pending at any time, and yield
+    `(index, future)` for every job in order of completion, where `index`
+    is the position of the job in `jobs`.
+    """
+    pending: Dict[Future, int] = {}
+    jobs = enumerate(jobs)
+    while True:
+        for (index, job) in jobs:
+            pending[executor.submit(fn, *job)] = index
+            if len(pending) >= 2 * workers:
+                break
+        if not pending:
+            return
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield pending.pop(future), future
+
+def wl_test_many(pairs: Sequence[Tuple[np.ndarray, ...]],
+                 methods: Sequence[str], workers: Optional[int] = None,
+                 timeout: Optional[float] = None,
+                 **kwargs) -> Iterator[WLTestResult]:
+    """
+    Run `wl_test()` for every method on every pair, and yield a
+    `WLTestResult` per job as soon as it completes. Each pair is
+    `(G, H)` or `(G, H, G_precolor, H_precolor)`; results refer to pairs by
+    their index. Extra keyword arguments are passed to `wl_test()`.
+
+    Jobs are spread over `workers` processes (all cores by default; `0`
+    runs them in this process). Pairs are sent to every worker once, and at
+    most two jobs per worker are pending at any time. A job which raises or
+    runs longer than `timeout` seconds yields a result with `error` set,
+    without affecting the other jobs.
+    """
+    pairs = [tuple(pair) for pair in pairs]
+    jobs = [(method, pair) for pair in range(len(pairs)) for method in methods]
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers == 0:
+        _init_worker(pairs)
+        for (method, pair) in jobs:
+            yield _run_job(method, pair, timeout, kwargs)
+        return
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker,
+                             initargs=(pairs, )) as executor:
+        for (index, future) in submit_bounded(
+            executor, _run_job,
+            ((method, pair, timeout, kwargs) for (method, pair) in jobs),
+            workers
+        ):
+            try:
+                yield future.result()
+            except Exception as e:
+                method, pair = jobs[index]
+                yield WLTestResult(method, pair, None,
+                                   f"{type(e).__name__}: {e}")
+
+class WLClasses(NamedTuple):
+    method: str
+    # The fingerprint of every graph, in order.
+    fingerprints: List[str]
+    # Indices of graphs with equal fingerprints, in order of first member.
+    classes: List[List[int]]
+
+    @property
+    def sizes(self) -> List[int]:
+        return [len(members) for members in self.classes]
+
+def _fingerprint_chunk(method: str, chunk: list, kwargs: dict) -> List[str]:
+    return [fingerprint(wl_representation(method, graph, precolor,
+                                          **kwargs))
+            for (graph, precolor) in chunk]
+
+def wl_classes(method: str,
+               graphs: Iterable[Union[np.ndarray, CSRAdj, Tuple]],
+               workers: Optional[int] = None, chunk_size: int = 256,
+               cache: Optional[RepresentationCache] = None,
+               **kwargs) -> WLClasses:
+    """
+    Group graphs into classes which `method` cannot tell apart, refining
+    every graph once: two graphs are in the same class iff the fingerprints
+    of their representations are equal, i.e. iff `wl_test()` would not
+    distinguish them (up to collisions of 128-bit digests).
+
+    Each graph is a sparse adjacency matrix or a `CSRAdj` (which keeps
+    isolated nodes, e.g. from a `GraphArchive`), or a tuple `(graph,
+    precolor)`. Graphs are read lazily and sent to `workers` processes (all
+    cores by default; `0` runs in this process) `chunk_size` at a time.
+    `cache` is only supported in this process.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if cache is not None and workers != 0:
+        raise ValueError('A cache is only supported with workers=0!')
+
+    def chunks() -> Iterator[list]:
+        chunk = []
+        for graph in graphs:
+            chunk.append(graph if isinstance(graph, tuple) else (graph, None))
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    fingerprints: List[str] = []
+    if workers == 0:
+        for chunk in chunks():
+            fingerprints += _fingerprint_chunk(method, chunk,
+                                               dict(kwargs, cache=cache))
+    else:
+        results: Dict[int, List[str]] = {}
+        with ProcessPoolExecutor(workers) as executor:
+            for (index, future) in submit_bounded(
+                executor, _fingerprint_chunk,
+                ((method, chunk, kwargs) for chunk in chunks()), workers
+            ):
+                results[index] = future.result()
+        for index in range(len(results)):
+            fingerprints += results.pop(index)
+
+    members: Dict[str, List[int]] = {}
+    for (index, digest) in enumerate(fingerprints):
+        members.setdefault(digest, []).append(index)
+    return WLClasses(method, fingerprints, list(members.values()))
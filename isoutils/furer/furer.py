@@ -1,82 +1,194 @@
 import numpy as np
-from typing import List, Set, Tuple
-from ..utils import AdjList
+import warnings
+from typing import Dict, Iterator, List, Set, Tuple, Union
+from ..utils import AdjList, CSRAdj
 from .subsets import *
 
 class FurerNode:
-    def __init__(self, raw_node: int,
-                 node_set: Set[int]):
+    """
+    A Furer node of `raw_node`, whose subset of neighbors is stored as the
+    bitmask `mask` over the sorted neighbors of `raw_node`; `position` maps
+    each neighbor to its bit, and is shared by the meta node.
+    """
+    __slots__ = ('raw_node', 'mask', 'position')
+
+    def __init__(self, raw_node: int, mask: int,
+                 position: Dict[int, int]):
         self.raw_node = raw_node
-        self.node_set = node_set
-    
+        self.mask = mask
+        self.position = position
+
+    @property
+    def node_set(self) -> Set[int]:
+        return {node for (node, i) in self.position.items()
+                if self.mask >> i & 1}
+
     def __repr__(self) -> str:
         return f"FurerNode({self.raw_node}, {self.node_set})"
-    
+
+    def __contains__(self, node: int) -> bool:
+        i = self.position.get(node)
+        return i is not None and bool(self.mask >> i & 1)
+
     def is_connected(self, other: "FurerNode", 
                      twisted: bool = False) -> bool:
         if self.raw_node == other.raw_node:
             return False
-        con1 = other.raw_node in self.node_set
-        con2 = self.raw_node in other.node_set
+        con1 = other.raw_node in self
+        con2 = self.raw_node in other
         return (con1 == con2) ^ twisted
     
     def __hash__(self) -> int:
-        return hash((self.raw_node, frozenset(self.node_set)))
+        return hash((self.raw_node, self.mask))
 
 class MetaNode:
-    def __init__(self):
-        self.raw_node: int
-        self.node_list: List[Set[int]] = []
-    
+    """
+    The Furer nodes of a raw node, one per even subset of its neighbors.
+    Nodes are created lazily when iterating, in the order of
+    `even_subsets()`; `gray_nodes()` yields them in Gray code order instead.
+    """
+    def __init__(self, raw_node: int, neighbors: List[int]):
+        self.raw_node = raw_node
+        self.position: Dict[int, int] = {
+            node: i for (i, node) in enumerate(neighbors)
+        }
+
     @staticmethod
-    def from_adj(adj: AdjList, node: int) -> "MetaNode":
-        meta_node = MetaNode()
-        meta_node.raw_node = node
-        meta_node.node_list = even_subsets(adj.adj_dict[node])
-        return meta_node
-
-    def __iter__(self):
-        self.counter = 0
-        return self
-    
-    def __next__(self) -> FurerNode:
-        try:
-            node = FurerNode(self.raw_node, self.node_list[self.counter])
-        except IndexError:
-            raise StopIteration
-        self.counter += 1
-        return node
+    def from_adj(adj: Union[AdjList, CSRAdj], node: int) -> "MetaNode":
+        return MetaNode(node, adj.neighbors(node).tolist())
+
+    def __len__(self) -> int:
+        return 2 ** max(0, len(self.position) - 1)
+
+    def __iter__(self) -> Iterator[FurerNode]:
+        for mask in iter_even_subset_masks(len(self.position)):
+            yield FurerNode(self.raw_node, mask, self.position)
+
+    def gray_nodes(self) -> Iterator[FurerNode]:
+        for mask in gray_even_subset_masks(len(self.position)):
+            yield FurerNode(self.raw_node, mask, self.position)
 
 class FurerGraph:
-    def __init__(self, raw_graph: AdjList,
+    def __init__(self, raw_graph: Union[AdjList, CSRAdj],
                  twist: List[Tuple[int, int]] = []):
-        self.node_list: List[FurerNode] = sum(
-            [list(MetaNode.from_adj(raw_graph, node))
-             for node in range(raw_graph.num_nodes)], start=[]
-        )
-        self.node_color: List[int] = sum(
-            [[node for _ in MetaNode.from_adj(raw_graph, node)]
-             for node in range(raw_graph.num_nodes)], start=[]
-        )
+        check_furer_graph_size(raw_graph)
+        meta_nodes = [MetaNode.from_adj(raw_graph, node)
+                      for node in range(raw_graph.num_nodes)]
+        self.node_list: List[FurerNode] = [
+            furer_node for meta_node in meta_nodes for furer_node in meta_node
+        ]
+        self.node_color: List[int] = [
+            furer_node.raw_node for furer_node in self.node_list
+        ]
         self.twist = twist
         for node_pair in twist:
             assert raw_graph.has_edge(*node_pair)
     
     def to_sparse_adj(self) -> np.ndarray:
+        twist = {frozenset(node_pair) for node_pair in self.twist}
         adj: List[np.ndarray] = []
         for (i1, n1) in enumerate(self.node_list):
             for (i2, n2) in enumerate(self.node_list):
                 if n1.is_connected(n2, 
-                                   twisted=(n1.raw_node, n2.raw_node)
-                                   in self.twist or
-                                   (n2.raw_node, n1.raw_node)
-                                   in self.twist):
+                                   twisted=frozenset((n1.raw_node,
+                                                      n2.raw_node))
+                                   in twist):
                     adj.append(np.array([i1, i2], dtype=np.int64))
         return np.stack(adj).T
 
     def get_precolor(self) -> np.ndarray:
         return np.array(self.node_color, dtype=np.int64)
+
+def furer_graph_size(raw_graph: Union[AdjList, CSRAdj]) -> Tuple[int, int]:
+    """
+    Return the number of nodes and (directed) edges of the untwisted Furer
+    graph of `raw_graph`, without building it. A twist changes the number
+    of edges by at most a few per twisted raw edge.
+    """
+    raw_graph = CSRAdj.from_adj(raw_graph)
+    degree = raw_graph.degree.astype(object)
+    sizes = np.array([2 ** max(0, int(d) - 1) for d in degree],
+                     dtype=object)
+    # Among the Furer nodes of a, those containing a given neighbor.
+    containing = np.array([s // 2 if d >= 2 else 0
+                           for (s, d) in zip(sizes, degree)], dtype=object)
+    num_nodes = int(sizes.sum())
+    num_edges = num_nodes ** 2 - int((sizes ** 2).sum())
+    for (a, b) in zip(raw_graph.sources().tolist(),
+                      raw_graph.indices.tolist()):
+        if a == b:
+            continue
+        connected = containing[a] * containing[b] + \
+            (sizes[a] - containing[a]) * (sizes[b] - containing[b])
+        num_edges -= int(sizes[a] * sizes[b] - connected)
+    return num_nodes, num_edges
+
+def check_furer_graph_size(raw_graph: Union[AdjList, CSRAdj],
+                           max_edges: int = 10 ** 8) -> Tuple[int, int]:
+    """
+    Warn if the Furer graph of `raw_graph` has more than `max_edges` edges.
+    Return its size, as given by `furer_graph_size()`.
+    """
+    num_nodes, num_edges = furer_graph_size(raw_graph)
+    if num_edges > max_edges:
+        warnings.warn(
+            f"The Furer graph has {num_nodes} nodes and {num_edges} edges "
+            f"(about {16 * num_edges / 2 ** 30:.1f} GiB as edge index)",
+            RuntimeWarning, stacklevel=3
+        )
+    return num_nodes, num_edges
     
+def build_furer_graph(raw_graph: Union[AdjList, CSRAdj],
+                      twist: List[Tuple[int, int]] = []) -> \
+    Tuple[np.ndarray, np.ndarray]:
+    """
+    Build the same sparse adjacency matrix and precolor as
+    `FurerGraph(raw_graph, twist)`, without comparing Furer nodes one by
+    one.
+
+    The Furer nodes of a raw node are the even subsets of its neighbors,
+    stored as bitmasks over its sorted neighbor list. Rows of the adjacency
+    matrix are built one raw node at a time: Furer nodes of non-adjacent
+    raw nodes are always connected, and those of adjacent raw nodes are
+    connected iff their bits for each other agree, unless the edge is
+    twisted.
+    """
+    raw_graph = CSRAdj.from_adj(raw_graph)
+    check_furer_graph_size(raw_graph)
+    num_raw = raw_graph.num_nodes
+    for node_pair in twist:
+        assert raw_graph.has_edge(*node_pair)
+
+    # position[a, b] is the index of b among the neighbors of a.
+    src = raw_graph.sources()
+    adjacent = np.zeros((num_raw, num_raw), dtype=bool)
+    adjacent[src, raw_graph.indices] = True
+    position = np.zeros((num_raw, num_raw), dtype=np.int64)
+    position[src, raw_graph.indices] = \
+        np.arange(src.shape[0]) - raw_graph.indptr[src]
+    twisted = np.zeros((num_raw, num_raw), dtype=bool)
+    for (a, b) in twist:
+        twisted[a, b] = twisted[b, a] = True
+
+    masks = [even_subset_masks(int(deg)) for deg in raw_graph.degree]
+    raw_node = np.repeat(np.arange(num_raw, dtype=np.int64),
+                         [m.shape[0] for m in masks])
+    mask = np.concatenate(masks)
+    offset = np.cumsum([0] + [m.shape[0] for m in masks])
+
+    rows, cols = [], []
+    for a in range(num_raw):
+        con1 = (mask[offset[a]:offset[a + 1], None]
+                >> position[a, raw_node][None, :]) & 1
+        con2 = (mask >> position[raw_node, a]) & 1
+        connected = np.where(adjacent[a, raw_node],
+                             (con1 == con2) ^ twisted[a, raw_node], True)
+        connected &= raw_node != a
+        r, c = np.nonzero(connected)
+        rows.append(r + offset[a])
+        cols.append(c)
+    return np.stack([np.concatenate(rows), np.concatenate(cols)]), raw_node
+
 def get_furer_graph_pair(edge_index: np.ndarray) -> \
     Tuple[np.ndarray, np.ndarray]:
     """
@@ -87,11 +199,8 @@ def get_furer_graph_pair(edge_index: np.ndarray) -> \
     assert len(edge_index.shape) == 2 and\
            edge_index.shape[0] == 2 and\
            edge_index.shape[1] > 0
-    adj = AdjList.from_sparse_adj(edge_index)
-    return (FurerGraph(adj).to_sparse_adj(),
-        FurerGraph(adj, [(edge_index[0, 0], edge_index[1, 0])]
-                   ).to_sparse_adj()
-    )
+    G, H, _, _ = get_furer_graph_pair_with_precolor(edge_index)
+    return G, H
 
 def get_furer_graph_pair_with_precolor(edge_index: np.ndarray) -> \
     Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
@@ -100,11 +209,20 @@ def get_furer_graph_pair_with_precolor(edge_index: np.ndarray) -> \
     matrices representing the pair of Furer graphs generated from the
     given graph, as well as two length-(N_furer) vectors representing 
     their node precoloring.
+
+    Furer nodes are numbered raw node by raw node, with the even subsets of
+    each raw node's neighbors in the order of its sorted neighbor list.
+    Before Furer graphs were built from bitmasks, subsets followed the
+    iteration order of Python sets. The precolors are the same, but for
+    some base graphs the node numbering of G and H differs from versions
+    before that change. The graphs are isomorphic to the former ones.
     """
     assert len(edge_index.shape) == 2 and\
            edge_index.shape[0] == 2 and\
            edge_index.shape[1] > 0
-    adj = AdjList.from_sparse_adj(edge_index)
-    G = FurerGraph(adj)
-    H = FurerGraph(adj, [(edge_index[0, 0], edge_index[1, 0])])
-    return G.to_sparse_adj(), H.to_sparse_adj(), G.get_precolor(), H.get_precolor()
+    adj = CSRAdj.from_sparse_adj(edge_index)
+    G, G_precolor = build_furer_graph(adj)
+    H, H_precolor = build_furer_graph(
+        adj, [(int(edge_index[0, 0]), int(edge_index[1, 0]))]
+    )
+    return G, H, G_precolor, H_precolor
@@ -1,4 +1,5 @@
-from typing import Set, List
+import numpy as np
+from typing import Iterator, Set, List
 from itertools import combinations
 
 def even_subsets(s: Set[int]) -> List[Set[int]]:
@@ -14,3 +15,44 @@ def odd_subsets(s: Set[int]) -> List[Set[int]]:
     for n in range(1, num_elems + 1, 2):
         subsets += list(map(set, combinations(s, n)))
     return subsets
+
+def even_subset_masks(num_elems: int) -> np.ndarray:
+    """
+    Return the even subsets of `range(num_elems)` as bitmasks (bit i set
+    iff element i is in the subset), in the order of `even_subsets()`: by
+    size, then lexicographically.
+    """
+    masks = np.arange(2 ** num_elems, dtype=np.int64)
+    bits = (masks[:, None] >> np.arange(num_elems)) & 1
+    size = bits.sum(axis=1)
+    masks, bits, size = masks[size % 2 == 0], bits[size % 2 == 0], \
+        size[size % 2 == 0]
+    # Among subsets of equal size, the lexicographically smaller one has the
+    # larger value if element i weighs 2 ** (num_elems - 1 - i).
+    weight = bits @ (1 << np.arange(num_elems - 1, -1, -1, dtype=np.int64))
+    return masks[np.lexsort((-weight, size))]
+
+def iter_even_subset_masks(num_elems: int) -> Iterator[int]:
+    """
+    Lazily yield the bitmasks of `even_subset_masks(num_elems)`, in the
+    same order.
+    """
+    for n in range(0, num_elems + 1, 2):
+        for subset in combinations(range(num_elems), n):
+            yield sum(1 << i for i in subset)
+
+def gray_even_subset_masks(num_elems: int) -> Iterator[int]:
+    """
+    Lazily yield the even subsets of `range(num_elems)` as bitmasks, in
+    reflected Gray code order over the first `num_elems - 1` elements, with
+    the last element as parity bit: consecutive subsets differ in at most
+    two elements, and each step costs O(1).
+    """
+    mask = 0
+    yield mask
+    parity_bit = 1 << max(0, num_elems - 1)
+    for i in range(1, 2 ** max(0, num_elems - 1)):
+        # Step i of the Gray code flips the lowest set bit of i, which
+        # flips the parity of the first elements as well.
+        mask ^= (i & -i) | parity_bit
+        yield mask
@@ -0,0 +1,118 @@
+import numpy as np
+from .wl import WL2Base
+from .comparer import METHODS, method_resolve, wl_test
+from typing import Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+# (weaker, stronger) relations from the SWL paper which do not follow from
+# the operators and pooling of the methods.
+PAPER_ORDER = [
+    ('WL1', 'WL2'),
+    ('WL1', 'SWL_VS'),
+    ('WL2', 'FWL2'),
+    ('SWL_SV', 'PSWL_VS'),
+    ('PSWL_SV', 'SSWL_VS'),
+    ('FullSWL_SV', 'SSWL_VS'),
+    ('SSWL_SV', 'LFWL'),
+    ('LFWL', 'SLFWL'),
+    ('SLFWL', 'FWL2'),
+]
+
+POOLING_ORDER = {'all': 0, 'vs': 1, 'sv': 2}
+
+def structurally_weaker(weaker: str, stronger: str) -> bool:
+    """
+    Whether `weaker` is at most as expressive as `stronger` because it uses a
+    subset of its operators and a coarser pooling.
+    """
+    A, B = method_resolve(weaker), method_resolve(stronger)
+    if not (issubclass(A, WL2Base) and issubclass(B, WL2Base)):
+        return False
+    return set(A.operators) <= set(B.operators) and \
+        POOLING_ORDER[A.pooling] <= POOLING_ORDER[B.pooling]
+
+def stronger_methods(methods: Sequence[str] = METHODS) -> Dict[str, Set[str]]:
+    """
+    Return, for every method, the set of other methods which are known to be
+    at least as expressive, i.e. the transitive closure of `PAPER_ORDER` and
+    `structurally_weaker()`.
+    """
+    edges: Dict[str, Set[str]] = {m: set() for m in METHODS}
+    for a in METHODS:
+        for b in METHODS:
+            if a != b and structurally_weaker(a, b):
+                edges[a].add(b)
+    for (a, b) in PAPER_ORDER:
+        edges[a].add(b)
+
+    closure = {}
+    for m in methods:
+        seen, stack = set(), [m]
+        while stack:
+            for n in edges[stack.pop()]:
+                if n not in seen:
+                    seen.add(n)
+                    stack.append(n)
+        seen.discard(m)
+        closure[m] = seen & set(methods)
+    return closure
+
+class SweepResult(NamedTuple):
+    method: str
+    pair: int
+    result: bool
+    implied_by: Optional[str] = None
+
+def wl_sweep(pairs: Sequence[Tuple[np.ndarray, ...]],
+             methods: Sequence[str] = METHODS, verify: bool = False,
+             **kwargs) -> Dict[Tuple[str, int], SweepResult]:
+    """
+    Run `wl_test()` for every method on every pair, skipping the tests
+    whose results are implied by the hierarchy (see `stronger_methods()`):
+    if a method distinguishes a pair, so does every stronger method; if it
+    does not, neither does any weaker method. Each pair is `(G, H)` or
+    `(G, H, G_precolor, H_precolor)`; extra keyword arguments are passed to
+    `wl_test()`.
+
+    Implied results record the method they were derived from in
+    `implied_by`. With `verify=True`, every test is run, so that the
+    results can be checked by `hierarchy_violations()`.
+    """
+    stronger = stronger_methods(methods)
+    weaker = {m: {n for n in methods if m in stronger[n]} for m in methods}
+
+    results = {}
+    for pair, graphs in enumerate(pairs):
+        undecided = list(methods)
+        while undecided:
+            # Test the method which settles the most others in the worst case.
+            if verify:
+                method = undecided[0]
+            else:
+                method = max(undecided, key=lambda m: min(
+                    sum(n in stronger[m] for n in undecided),
+                    sum(n in weaker[m] for n in undecided),
+                ))
+            result = wl_test(method, *graphs, **kwargs)
+            results[method, pair] = SweepResult(method, pair, result)
+            undecided.remove(method)
+            if verify:
+                continue
+            implied = stronger[method] if result else weaker[method]
+            for m in [m for m in undecided if m in implied]:
+                results[m, pair] = SweepResult(m, pair, result, method)
+                undecided.remove(m)
+
+    return results
+
+def hierarchy_violations(
+    results: Dict[Tuple[str, int], SweepResult]
+) -> List[Tuple[str, str, int]]:
+    """
+    Return the `(weaker, stronger, pair)` triples for which the weaker
+    method distinguishes the pair while the stronger one does not.
+    """
+    methods = sorted({m for (m, _) in results})
+    stronger = stronger_methods(methods)
+    return [(m, n, pair) for (m, pair), res in sorted(results.items())
+            if res.result for n in sorted(stronger[m])
+            if (n, pair) in results and not results[n, pair].result]
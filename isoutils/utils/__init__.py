@@ -1,2 +1,7 @@
 from .adj import AdjList
-from .multiset import MultiSet, FrozenMultiSet
\ No newline at end of file
+from .csr import CSRAdj
+from .multiset import MultiSet, FrozenMultiSet, ArrayMultiSet, RowMultiSet, Representation
+from .compress import dense_rank, compact, same_partition, as_hashable, mix64, SharedColorTable
+from .hashing import encode, fingerprint, HashRelabel
+from .cache import RepresentationCache
+from .graphio import decode_graph6, decode_sparse6, decode_graph6_batch, read_graph6, GraphArchive
\ No newline at end of file
@@ -10,6 +10,13 @@ class AdjList:
         self.num_edges = 0
         self.adj_dict: Dict[int, Set[int]] = {}
     
+    def neighbors(self, node: int) -> np.ndarray:
+        """
+        Return the sorted array of nodes adjacent to `node`.
+        """
+        return np.sort(np.fromiter(self.adj_dict.get(node, ()),
+                                   dtype=np.int64))
+
     def has_edge(self, src: int, tgt: int) -> bool:
         return src in self.adj_dict and tgt in self.adj_dict[src]
 
@@ -0,0 +1,140 @@
+import numpy as np
+import pickle
+import sqlite3
+from hashlib import blake2b
+from typing import Any, Dict, Optional, Union
+from .csr import CSRAdj
+
+class RepresentationCache:
+    """
+    Persistent store of graph representations, backed by a sqlite file.
+
+    Entries are keyed by `RepresentationCache.key()` and evicted in least
+    recently used order once their total size exceeds `max_bytes`. Lookups
+    are counted in `self.hits` and `self.misses`. Their timestamps are only
+    written in batches of `flush_every`, by `put()` and by `close()`.
+    """
+    VERSION = b'isoutils-cache-3'
+    # Solver options which only change how a representation is computed,
+    # and are left out of keys. `engine='matmul'` of FWL2 pools hashed
+    # signatures, so that engine is kept.
+    EXECUTION_OPTIONS = ('workers', 'chunk_size', 'pool', 'block_size',
+                         'engine', 'incremental', 'symmetric')
+
+    def __init__(self, path: str = '.isoutils_cache.sqlite',
+                 max_bytes: int = 256 * 2 ** 20, flush_every: int = 256):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.flush_every = flush_every
+        # Timestamps of lookups which are not written yet.
+        self.touched: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            'key TEXT PRIMARY KEY, value BLOB NOT NULL, '
+            'size INTEGER NOT NULL, last_used INTEGER NOT NULL)'
+        )
+        self.conn.commit()
+        self.clock = self.conn.execute(
+            'SELECT COALESCE(MAX(last_used), 0) FROM entries'
+        ).fetchone()[0]
+
+    @staticmethod
+    def key(method: str, edge_index: Union[np.ndarray, CSRAdj],
+            precolor: Optional[np.ndarray] = None, identity: bool = True,
+            **kwargs) -> str:
+        """
+        Return a canonical digest of a graph (given as in `wl_test()`), its
+        precolor, the method name, the identity flag and the solver keyword
+        arguments, except for `EXECUTION_OPTIONS`. The digest does not
+        depend on the order of edges or on duplicate edges.
+        """
+        kwargs = {k: v for (k, v) in kwargs.items()
+                  if k not in RepresentationCache.EXECUTION_OPTIONS
+                  or (k, v) == ('engine', 'matmul')}
+        graph = edge_index if isinstance(edge_index, CSRAdj) \
+            else CSRAdj.from_sparse_adj(np.asarray(edge_index))
+        h = blake2b(RepresentationCache.VERSION, digest_size=16)
+        for part in (method, identity, sorted(kwargs.items()),
+                     graph.num_nodes):
+            h.update(repr(part).encode() + b'\0')
+        h.update(graph.indptr.astype(np.int64).tobytes() + b'\0')
+        h.update(graph.indices.astype(np.int64).tobytes() + b'\0')
+        if precolor is None:
+            h.update(b'none')
+        else:
+            h.update(np.asarray(precolor, dtype=np.int64).tobytes())
+        return h.hexdigest()
+
+    def tick(self) -> int:
+        self.clock += 1
+        return self.clock
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Return the value stored under `key`, or `None` if there is none.
+        """
+        row = self.conn.execute('SELECT value FROM entries WHERE key = ?',
+                                (key, )).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.touched[key] = self.tick()
+        if len(self.touched) >= self.flush_every:
+            self.flush()
+        return pickle.loads(row[0])
+
+    def flush(self):
+        """
+        Write the timestamps of recent lookups.
+        """
+        if self.touched:
+            self.conn.executemany(
+                'UPDATE entries SET last_used = ? WHERE key = ?',
+                [(t, k) for (k, t) in self.touched.items()]
+            )
+            self.conn.commit()
+            self.touched = {}
+
+    def put(self, key: str, value: Any):
+        """
+        Store `value` under `key`, then evict least recently used entries
+        until the cache fits in `max_bytes` again.
+        """
+        self.flush()
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self.conn.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)',
+                          (key, blob, len(blob), self.tick()))
+        total = 0
+        evicted = []
+        for (k, size) in self.conn.execute(
+            'SELECT key, size FROM entries ORDER BY last_used DESC'
+        ).fetchall():
+            total += size
+            if total > self.max_bytes:
+                evicted.append((k, ))
+        self.conn.executemany('DELETE FROM entries WHERE key = ?', evicted)
+        self.conn.commit()
+
+    def clear(self):
+        self.touched = {}
+        self.conn.execute('DELETE FROM entries')
+        self.conn.commit()
+        self.hits = self.misses = 0
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def __len__(self) -> int:
+        return self.conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def stats(self) -> Dict[str, int]:
+        size = self.conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM entries'
+        ).fetchone()[0]
+        return {'hits': self.hits, 'misses': self.misses,
+                'entries': len(self), 'bytes': size}
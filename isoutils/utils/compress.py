@@ -0,0 +1,100 @@
+import numpy as np
+from typing import Any, Dict
+
+def dense_rank(color_list: np.ndarray) -> np.ndarray:
+    """
+    Relabel an array of signatures by their dense ranks (starting from 0),
+    i.e. equal signatures get equal labels and labels respect the order of
+    signatures. This is equivalent to `rankdata(color_list, method='dense')
+    - 1`, but avoids sorting all signatures with Python comparisons.
+
+    * A 1D numeric array is compressed by `np.unique`.
+    * A 2D numeric array is regarded as one signature per row, i.e. a tuple
+    of fixed-width integers, and is ranked by lexsorting its columns.
+    * An `object`-array (of any shape) is flattened and relabeled through a
+    dictionary, so that only the distinct signatures are ever sorted.
+    """
+    if color_list.dtype != object:
+        if color_list.ndim != 2:
+            _, inverse = np.unique(color_list, return_inverse=True)
+            return inverse.reshape(-1).astype(np.int64)
+        if color_list.shape[1] == 0:
+            return np.zeros((color_list.shape[0], ), dtype=np.int64)
+        order = np.lexsort(color_list.T[::-1])
+        sorted_list = color_list[order]
+        is_new = np.ones((color_list.shape[0], ), dtype=np.int64)
+        is_new[1:] = np.any(sorted_list[1:] != sorted_list[:-1], axis=1)
+        rank = np.empty((color_list.shape[0], ), dtype=np.int64)
+        rank[order] = np.cumsum(is_new) - 1
+        return rank
+
+    color_list = color_list.reshape(-1)
+    table: Dict[Any, int] = {}
+    labels = np.fromiter((table.setdefault(sig, len(table))
+                          for sig in color_list),
+                         dtype=np.int64, count=len(color_list))
+    keys = list(table)
+    rank = np.empty((len(keys), ), dtype=np.int64)
+    rank[sorted(range(len(keys)), key=keys.__getitem__)] = \
+        np.arange(len(keys), dtype=np.int64)
+    return rank[labels]
+
+def compact(color: np.ndarray) -> np.ndarray:
+    """
+    Store integer colors as `np.int32` if they all fit, else as `np.int64`.
+    """
+    info = np.iinfo(np.int32)
+    if color.size and info.min <= color.min() and color.max() <= info.max:
+        return color.astype(np.int32, copy=False)
+    return color.astype(np.int64, copy=False)
+
+def same_partition(a: np.ndarray, b: np.ndarray) -> bool:
+    """
+    Test whether two colorings induce the same partition.
+    """
+    num_pairs = np.unique(np.stack([a, b], axis=1), axis=0).shape[0]
+    return num_pairs == np.unique(a).shape[0] == np.unique(b).shape[0]
+
+def as_hashable(color_list: np.ndarray) -> np.ndarray:
+    """
+    Return a 1D `object`-array of hashable signatures. Rows of a 2D numeric
+    array are converted to tuples; other arrays are returned unchanged.
+    """
+    if color_list.dtype == object or color_list.ndim != 2:
+        return color_list
+    signatures = np.empty((color_list.shape[0], ), dtype=object)
+    signatures[:] = list(map(tuple, color_list.tolist()))
+    return signatures
+
+def mix64(x: np.ndarray, seed: int = 0) -> np.ndarray:
+    """
+    A deterministic pseudo-random function of integers (the SplitMix64
+    finalizer), parameterized by `seed`. Returns an array of `np.uint64`.
+    """
+    with np.errstate(over='ignore'):
+        z = x.astype(np.uint64) + \
+            np.uint64((seed * 0x9E3779B97F4A7C15 + 1) & 0xFFFFFFFFFFFFFFFF)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+class SharedColorTable:
+    """
+    Relabel signatures through one dictionary shared by several solvers, so
+    that equal signatures get equal labels across graphs. Labels are given
+    in order of first appearance; call `reset()` before each round.
+    """
+    def __init__(self):
+        self.table: Dict[Any, int] = {}
+
+    def reset(self):
+        self.table = {}
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def __call__(self, color_list: np.ndarray) -> np.ndarray:
+        color_list = as_hashable(color_list).reshape(-1)
+        return np.fromiter((self.table.setdefault(sig, len(self.table))
+                            for sig in color_list),
+                           dtype=np.int64, count=len(color_list))
@@ -0,0 +1,151 @@
+import numpy as np
+from typing import Optional, Tuple, Union
+from .adj import AdjList
+
+class CSRAdj:
+    """
+    Maps nodes to adjacent nodes, stored in compressed sparse row (CSR)
+    format: the neighbors of node `x` are `indices[indptr[x]:indptr[x + 1]]`,
+    sorted in ascending order, and `degree[x]` is their count.
+    """
+    def __init__(self, num_nodes: int, indptr: np.ndarray,
+                 indices: np.ndarray):
+        self.num_nodes = num_nodes
+        self.num_edges = indices.shape[0]
+        self.indptr = indptr
+        self.indices = indices
+        self.degree = np.diff(indptr)
+
+    def neighbors(self, node: int) -> np.ndarray:
+        """
+        Return the sorted array of nodes adjacent to `node`. The result is a
+        view into `self.indices` and should not be modified.
+        """
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    def has_edge(self, src: int, tgt: int) -> bool:
+        if not 0 <= src < self.num_nodes:
+            return False
+        nbrs = self.neighbors(src)
+        pos = np.searchsorted(nbrs, tgt)
+        return bool(pos < nbrs.shape[0] and nbrs[pos] == tgt)
+
+    def has_edges(self, src: np.ndarray, tgt: np.ndarray) -> np.ndarray:
+        """
+        Vectorized `has_edge()`, for nodes `src` and `tgt` of the graph.
+        Edge keys `src * n + tgt` are sorted like the edges.
+        """
+        keys = self.sources() * self.num_nodes + self.indices
+        queries = np.asarray(src, dtype=np.int64) * self.num_nodes + tgt
+        if keys.shape[0] == 0:
+            return np.zeros(queries.shape, dtype=bool)
+        pos = np.minimum(np.searchsorted(keys, queries), keys.shape[0] - 1)
+        return keys[pos] == queries
+
+    def sources(self) -> np.ndarray:
+        """
+        Return the source node of every entry of `self.indices`.
+        """
+        return np.repeat(np.arange(self.num_nodes, dtype=np.int64),
+                         self.degree)
+
+    def gather(self, nodes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Concatenate the neighbors of all `nodes`. Returns `(owner, nbrs)`,
+        where `nbrs[i]` is a neighbor of `nodes[owner[i]]`.
+        """
+        deg = self.degree[nodes]
+        owner = np.repeat(np.arange(nodes.shape[0], dtype=np.int64), deg)
+        offset = np.repeat(self.indptr[nodes] - (np.cumsum(deg) - deg), deg)
+        return owner, self.indices[offset + np.arange(owner.shape[0])]
+
+    def pair_union(self) -> "CSRAdj":
+        """
+        Return the CSR adjacency of the n * n pairs of nodes, where pair
+        `u * n + v` is adjacent to the nodes of N(u) and N(v), each once.
+        """
+        n = self.num_nodes
+        pairs = np.arange(n * n, dtype=np.int64)
+        owner_u, nbrs_u = self.gather(pairs // max(n, 1))
+        owner_v, nbrs_v = self.gather(pairs % max(n, 1))
+        # Drop the neighbors of v which are neighbors of u, too.
+        keep = ~self.has_edges(owner_v // max(n, 1), nbrs_v)
+        owner = np.concatenate([owner_u, owner_v[keep]])
+        nbrs = np.concatenate([nbrs_u, nbrs_v[keep]])
+        order = np.lexsort((nbrs, owner))
+        indptr = np.zeros((n * n + 1, ), dtype=np.int64)
+        np.cumsum(np.bincount(owner, minlength=n * n), out=indptr[1:])
+        return CSRAdj(n * n, indptr, nbrs[order])
+
+    def reverse(self) -> "CSRAdj":
+        """
+        Return the CSR adjacency with every edge reversed.
+        """
+        return CSRAdj.from_sparse_adj(self.to_sparse_adj()[::-1],
+                                      self.num_nodes)
+
+    @staticmethod
+    def from_dense_adj(A: np.ndarray) -> "CSRAdj":
+        """
+        Given a dense adjacency matrix (n * n shaped 0-1 matrix),
+        return its corresponding CSR adjacency.
+        """
+        assert len(A.shape) == 2
+        return CSRAdj.from_sparse_adj(np.stack(np.where(A)))
+
+    @staticmethod
+    def from_sparse_adj(edge_index: np.ndarray,
+                        num_nodes: Optional[int] = None) -> "CSRAdj":
+        """
+        Given a sparse adjacency matrix (2 * m shaped matrix of node
+        indices), return its corresponding CSR adjacency. Duplicate edges
+        are merged. If `num_nodes` is not given, it is inferred as the
+        largest node index plus one.
+        """
+        assert len(edge_index.shape) == 2 and edge_index.shape[0] == 2
+        edge_index = edge_index.astype(np.int64)
+        if num_nodes is None:
+            num_nodes = int(edge_index.max()) + 1 if edge_index.size else 0
+        keys = np.unique(edge_index[0] * num_nodes + edge_index[1])
+        src, tgt = keys // max(num_nodes, 1), keys % max(num_nodes, 1)
+        indptr = np.zeros((num_nodes + 1, ), dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=num_nodes), out=indptr[1:])
+        return CSRAdj(num_nodes, indptr, tgt)
+
+    @staticmethod
+    def from_adj(adj: Union[AdjList, "CSRAdj"]) -> "CSRAdj":
+        """
+        Convert an adjacency list to CSR adjacency.
+        """
+        if isinstance(adj, CSRAdj):
+            return adj
+        if adj.num_edges == 0:
+            return CSRAdj.from_sparse_adj(
+                np.zeros((2, 0), dtype=np.int64), adj.num_nodes
+            )
+        return CSRAdj.from_sparse_adj(adj.to_sparse_adj(), adj.num_nodes)
+
+    def to_adj_list(self) -> AdjList:
+        """
+        Convert the CSR adjacency to an adjacency list.
+        """
+        adj = AdjList()
+        adj.num_nodes = self.num_nodes
+        adj.num_edges = self.num_edges
+        adj.adj_dict = {node: set(self.neighbors(node).tolist())
+                        for node in range(self.num_nodes)}
+        return adj
+
+    def to_sparse_adj(self) -> np.ndarray:
+        """
+        Convert the CSR adjacency to sparse adjacency matrix.
+        """
+        return np.stack([self.sources(), self.indices])
+
+    def to_dense_adj(self) -> np.ndarray:
+        """
+        Convert the CSR adjacency to dense adjacency matrix.
+        """
+        adj_matrix = np.zeros((self.num_nodes, self.num_nodes), dtype=np.int64)
+        adj_matrix[self.sources(), self.indices] = 1
+        return adj_matrix
@@ -0,0 +1,234 @@
+import numpy as np
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+from .adj import AdjList
+from .csr import CSRAdj
+
+def graph6_bits(data: np.ndarray) -> np.ndarray:
+    """
+    Return the bits of graph6/sparse6 bytes, 6 per byte, most significant
+    bit first.
+    """
+    values = (data.astype(np.int64) - 63).astype(np.uint8)
+    return np.unpackbits(values[:, None], axis=1)[:, 2:].reshape(-1)
+
+def bits_to_int(bits: np.ndarray) -> np.ndarray:
+    """
+    Integers encoded by the rows of `bits`, most significant bit first.
+    """
+    weights = 1 << np.arange(bits.shape[-1] - 1, -1, -1, dtype=np.int64)
+    return bits.astype(np.int64) @ weights
+
+def decode_size(data: np.ndarray) -> Tuple[int, np.ndarray]:
+    """
+    Decode the number of nodes N(n) at the start of graph6/sparse6 bytes,
+    and return it with the remaining bytes.
+    """
+    if data.shape[0] == 0 or np.any((data < 63) | (data > 126)):
+        raise ValueError('Invalid graph6/sparse6 data!')
+    if data[0] != 126:
+        return int(data[0]) - 63, data[1:]
+    if data.shape[0] > 1 and data[1] != 126:
+        return int(bits_to_int(graph6_bits(data[1:4]))), data[4:]
+    return int(bits_to_int(graph6_bits(data[2:8]))), data[8:]
+
+def decode_graph6(line: Union[str, bytes]) -> CSRAdj:
+    """
+    Decode one graph in graph6 (or sparse6, if it starts with `:`) format,
+    with or without header, into an undirected `CSRAdj`.
+    """
+    if isinstance(line, str):
+        line = line.encode('ascii')
+    line = line.strip()
+    for header in (b'>>graph6<<', b'>>sparse6<<'):
+        if line.startswith(header):
+            line = line[len(header):]
+    if line.startswith(b':'):
+        return decode_sparse6(line)
+    num_nodes, data = decode_size(np.frombuffer(line, dtype=np.uint8))
+
+    # Bits enumerate the upper triangle column by column: (0, 1), (0, 2),
+    # (1, 2), (0, 3), ...
+    num_bits = num_nodes * (num_nodes - 1) // 2
+    bits = graph6_bits(data)
+    if bits.shape[0] < num_bits:
+        raise ValueError('Invalid graph6 data!')
+    A = np.zeros((num_nodes, num_nodes), dtype=bool)
+    A[np.tril_indices(num_nodes, -1)] = bits[:num_bits]
+    A |= A.T
+    indptr = np.zeros((num_nodes + 1, ), dtype=np.int64)
+    np.cumsum(A.sum(axis=1), out=indptr[1:])
+    return CSRAdj(num_nodes, indptr, np.nonzero(A)[1])
+
+def decode_sparse6(line: Union[str, bytes]) -> CSRAdj:
+    """
+    Decode one graph in sparse6 format (starting with `:`) into an
+    undirected `CSRAdj`. Multiple edges are merged.
+    """
+    if isinstance(line, str):
+        line = line.encode('ascii')
+    line = line.strip()
+    if not line.startswith(b':'):
+        raise ValueError('Invalid sparse6 data!')
+    num_nodes, data = decode_size(np.frombuffer(line[1:], dtype=np.uint8))
+    k = max(1, (num_nodes - 1).bit_length())
+    bits = graph6_bits(data)
+    units = bits[:bits.shape[0] // (k + 1) * (k + 1)].reshape(-1, k + 1)
+    b, x = units[:, 0].astype(np.int64), bits_to_int(units[:, 1:])
+
+    # Decoding keeps a current node v, starting at 0: every unit first adds
+    # b to v; then, if x > v, v jumps to x, else {x, v} is an edge. Hence
+    # v = max(v + b, x) after each unit, which unrolls into a running
+    # maximum, and w below is v after adding b. Decoding stops once w
+    # reaches num_nodes.
+    B = np.cumsum(b)
+    u = np.maximum.accumulate(np.maximum(x - B, 0)) if x.size else x
+    w = B + np.concatenate([[0], u[:-1]]).astype(np.int64)
+    stop = np.flatnonzero(w >= num_nodes)
+    end = stop[0] if stop.size else w.shape[0]
+    x, w = x[:end], w[:end]
+    edges = x <= w
+    x, w = x[edges], w[edges]
+    return CSRAdj.from_sparse_adj(
+        np.stack([np.concatenate([x, w]), np.concatenate([w, x])]),
+        num_nodes
+    )
+
+def decode_graph6_batch(lines: Sequence[bytes]) -> List[CSRAdj]:
+    """
+    Decode many graph6/sparse6 lines (without header), like
+    `decode_graph6()`. graph6 lines of equal length, such as all graphs on
+    n nodes, are decoded together as one array.
+    """
+    lines = [line.strip() for line in lines]
+    graphs: List[Optional[CSRAdj]] = [None] * len(lines)
+    groups: Dict[int, List[int]] = {}
+    for (index, line) in enumerate(lines):
+        if line.startswith(b':') or not line or line[0] == 126:
+            graphs[index] = decode_graph6(line)
+        else:
+            groups.setdefault(len(line), []).append(index)
+
+    for indices in groups.values():
+        data = np.frombuffer(b''.join(lines[i] for i in indices),
+                             dtype=np.uint8).reshape(len(indices), -1)
+        if np.any((data < 63) | (data > 126)) or \
+                np.any(data[:, 0] != data[0, 0]):
+            for i in indices:
+                graphs[i] = decode_graph6(lines[i])
+            continue
+        num_nodes = int(data[0, 0]) - 63
+        num_bits = num_nodes * (num_nodes - 1) // 2
+        bits = np.unpackbits((data[:, 1:] - 63)[:, :, None],
+                             axis=2)[:, :, 2:].reshape(len(indices), -1)
+        if bits.shape[1] < num_bits:
+            raise ValueError('Invalid graph6 data!')
+        A = np.zeros((len(indices), num_nodes, num_nodes), dtype=bool)
+        j, i = np.tril_indices(num_nodes, -1)
+        A[:, j, i] = bits[:, :num_bits]
+        A |= A.transpose(0, 2, 1)
+        degree = A.sum(axis=2)
+        split = np.cumsum(degree.sum(axis=1))[:-1]
+        targets = np.split(np.nonzero(A)[2], split)
+        indptr = np.zeros((len(indices), num_nodes + 1), dtype=np.int64)
+        np.cumsum(degree, axis=1, out=indptr[:, 1:])
+        for (k, index) in enumerate(indices):
+            graphs[index] = CSRAdj(num_nodes, indptr[k], targets[k])
+    return graphs
+
+def read_graph6(path: str, batch_size: int = 4096) -> Iterator[CSRAdj]:
+    """
+    Lazily decode a file of graph6 and/or sparse6 lines, one graph per
+    non-empty line, `batch_size` lines at a time (see
+    `decode_graph6_batch()`).
+    """
+    with open(path, 'rb') as f:
+        batch: List[bytes] = []
+        for line in f:
+            line = line.strip()
+            for header in (b'>>graph6<<', b'>>sparse6<<'):
+                if line.startswith(header):
+                    line = line[len(header):]
+            if line:
+                batch.append(line)
+            if len(batch) == batch_size:
+                yield from decode_graph6_batch(batch)
+                batch = []
+        yield from decode_graph6_batch(batch)
+
+class GraphArchive:
+    """
+    A collection of graphs packed on disk in the directory `path`, which is
+    memory-mapped rather than read:
+        * `edges.i32`: the edges of all graphs as little-endian int32 (src,
+        tgt) pairs, graph after graph, each graph's sorted like its
+        `CSRAdj`;
+        * `offsets.npy`: the edges of graph i are rows `offsets[i]` to
+        `offsets[i + 1]`;
+        * `num_nodes.npy`: the number of nodes of every graph.
+
+    Graphs are only read when accessed, e.g. `for adj in archive: solver.
+    set_graph(adj)` copies one graph at a time. Use `GraphArchive.write()`
+    to create an archive.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.offsets = np.load(os.path.join(path, 'offsets.npy'),
+                               mmap_mode='r')
+        self.num_nodes = np.load(os.path.join(path, 'num_nodes.npy'),
+                                 mmap_mode='r')
+        edges_path = os.path.join(path, 'edges.i32')
+        if os.path.getsize(edges_path) > 0:
+            self.edges = np.memmap(edges_path, dtype='<i4',
+                                   mode='r').reshape(-1, 2)
+        else:
+            self.edges = np.zeros((0, 2), dtype='<i4')
+
+    @staticmethod
+    def write(path: str, graphs: Iterable[Union[CSRAdj, AdjList, np.ndarray]]
+              ) -> "GraphArchive":
+        """
+        Pack `graphs` (adjacencies or sparse adjacency matrices) into the
+        directory `path`, one graph at a time, and open the archive.
+        """
+        os.makedirs(path, exist_ok=True)
+        offsets: List[int] = [0]
+        num_nodes: List[int] = []
+        with open(os.path.join(path, 'edges.i32'), 'wb') as f:
+            for graph in graphs:
+                if isinstance(graph, np.ndarray):
+                    graph = CSRAdj.from_sparse_adj(graph)
+                graph = CSRAdj.from_adj(graph)
+                if graph.num_nodes > np.iinfo(np.int32).max:
+                    raise ValueError('Too many nodes for int32 indices!')
+                edges = graph.to_sparse_adj().T.astype('<i4')
+                f.write(edges.tobytes())
+                offsets.append(offsets[-1] + edges.shape[0])
+                num_nodes.append(graph.num_nodes)
+        np.save(os.path.join(path, 'offsets.npy'),
+                np.array(offsets, dtype=np.int64))
+        np.save(os.path.join(path, 'num_nodes.npy'),
+                np.array(num_nodes, dtype=np.int64))
+        return GraphArchive(path)
+
+    def __len__(self) -> int:
+        return self.num_nodes.shape[0]
+
+    def edge_index(self, i: int) -> np.ndarray:
+        """
+        Return the sparse adjacency matrix of graph i, as a read-only view
+        of the archive.
+        """
+        return self.edges[self.offsets[i]:self.offsets[i + 1]].T
+
+    def __getitem__(self, i: int) -> CSRAdj:
+        edges = self.edges[self.offsets[i]:self.offsets[i + 1]]
+        num_nodes = int(self.num_nodes[i])
+        indptr = np.zeros((num_nodes + 1, ), dtype=np.int64)
+        np.cumsum(np.bincount(edges[:, 0], minlength=num_nodes),
+                  out=indptr[1:])
+        return CSRAdj(num_nodes, indptr, edges[:, 1].astype(np.int64))
+
+    def __iter__(self) -> Iterator[CSRAdj]:
+        for i in range(len(self)):
+            yield self[i]
@@ -0,0 +1,76 @@
+import numpy as np
+from hashlib import blake2b
+from typing import Any, Dict
+from .multiset import MultiSet, FrozenMultiSet, ArrayMultiSet, RowMultiSet
+from .compress import as_hashable
+
+def encode(obj: Any) -> bytes:
+    """
+    Serialize a signature canonically, i.e. independently of the process
+    and of the integer types involved. Supports (nested) tuples of integers,
+    `MultiSet` and `FrozenMultiSet`; multisets are serialized as sorted
+    (element, count) pairs.
+    """
+    if isinstance(obj, (int, np.integer)):
+        return str(int(obj)).encode()
+    if isinstance(obj, tuple):
+        return b'(' + b','.join(map(encode, obj)) + b')'
+    if isinstance(obj, MultiSet):
+        return b'{' + b','.join(sorted(
+            encode(elem) + b':' + str(cnt).encode()
+            for (elem, cnt) in obj.contents.items()
+        )) + b'}'
+    if isinstance(obj, ArrayMultiSet):
+        return b'{' + b','.join(sorted(
+            encode(elem) + b':' + str(cnt).encode()
+            for (elem, cnt) in zip(obj.palette, obj.counts.tolist())
+        )) + b'}'
+    if isinstance(obj, RowMultiSet):
+        palette = [encode(elem) for elem in obj.palette]
+        rows = []
+        for (row, cnt) in zip(obj.rows, obj.counts.tolist()):
+            values, counts = np.unique(row, return_counts=True)
+            rows.append(b'[' + b','.join(sorted(
+                palette[v] + b':' + str(c).encode()
+                for (v, c) in zip(values.tolist(), counts.tolist())
+            )) + b']:' + str(cnt).encode())
+        return b'{' + b','.join(sorted(rows)) + b'}'
+    if isinstance(obj, FrozenMultiSet):
+        return b'[' + b','.join(sorted(
+            encode(elem) + b':' + str(cnt).encode()
+            for (elem, cnt) in obj.contents
+        )) + b']'
+    return str(int(obj)).encode()
+
+def fingerprint(obj: Any, key: bytes = b'isoutils') -> str:
+    """
+    Return the 128-bit keyed BLAKE2b digest of `encode(obj)` as a hex string.
+    """
+    return blake2b(encode(obj), digest_size=16, key=key).hexdigest()
+
+class HashRelabel:
+    """
+    Relabel signatures by keyed BLAKE2b hashes of their serialization, so
+    that colors are deterministic across graphs, runs and processes: the
+    color of a signature is the top 63 bits of its 128-bit digest.
+
+    Every digest ever produced is audited: if two distinct 128-bit digests
+    share a color, a `RuntimeError` is raised.
+    """
+    def __init__(self, key: bytes = b'isoutils'):
+        self.key = key
+        self.audit: Dict[int, bytes] = {}
+
+    def __call__(self, color_list: np.ndarray) -> np.ndarray:
+        color_list = as_hashable(color_list).reshape(-1)
+        table: Dict[Any, int] = {}
+        for sig in color_list:
+            if sig in table:
+                continue
+            digest = blake2b(encode(sig), digest_size=16, key=self.key).digest()
+            color = int.from_bytes(digest[:8], 'big') >> 1
+            if self.audit.setdefault(color, digest) != digest:
+                raise RuntimeError(f"Hash collision on color {color}!")
+            table[sig] = color
+        return np.fromiter((table[sig] for sig in color_list),
+                           dtype=np.int64, count=len(color_list))
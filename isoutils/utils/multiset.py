@@ -1,4 +1,6 @@
-from typing import Dict, Any, FrozenSet, Tuple, Iterable
+import numpy as np
+from typing import Dict, Any, FrozenSet, Tuple, Iterable, Optional, Union
+from .compress import dense_rank, as_hashable
 
 class MultiSet:
     def __init__(self):
@@ -47,3 +49,133 @@ class FrozenMultiSet:
     
     def __hash__(self) -> int:
         return hash(self.contents)
+
+def palette_rank(color_list: np.ndarray) -> Tuple[Tuple, np.ndarray]:
+    """
+    Return the sorted tuple of distinct signatures of `color_list` (as given
+    by `as_hashable()`), and the index of every signature in it.
+    """
+    if color_list.dtype != object and color_list.ndim == 1:
+        palette, rank = np.unique(color_list, return_inverse=True)
+        return tuple(palette.tolist()), rank.reshape(-1)
+    color_list = as_hashable(color_list).reshape(-1)
+    rank = dense_rank(color_list)
+    palette = np.empty((int(rank.max(initial=-1)) + 1, ), dtype=object)
+    palette[rank] = color_list
+    return tuple(palette.tolist()), rank
+
+class ArrayMultiSet:
+    """
+    A frozen multiset, stored as the sorted tuple `palette` of its distinct
+    elements and the array `counts` of their multiplicities. The hash is
+    computed once, and again on unpickling since it depends on the process.
+    """
+    __slots__ = ('palette', 'counts', 'hash')
+
+    def __init__(self, palette: Tuple, counts: np.ndarray):
+        self.palette = palette
+        self.counts = counts.astype(np.int64)
+        self.hash = hash((palette, self.counts.tobytes()))
+
+    def __reduce__(self):
+        return (ArrayMultiSet, (self.palette, self.counts))
+
+    @staticmethod
+    def from_array(color_list: np.ndarray,
+                   weights: Optional[np.ndarray] = None) -> "ArrayMultiSet":
+        """
+        The multiset of the signatures of `color_list`, the i-th of which is
+        counted `weights[i]` times if given.
+        """
+        palette, rank = palette_rank(color_list)
+        return ArrayMultiSet(palette, np.bincount(rank, weights,
+                                                  minlength=len(palette)))
+
+    @property
+    def contents(self) -> Dict[Any, int]:
+        return dict(zip(self.palette, self.counts.tolist()))
+
+    def __len__(self) -> int:
+        return int(self.counts.sum())
+
+    def __repr__(self) -> str:
+        return repr(self.contents)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, ArrayMultiSet) and \
+            self.hash == other.hash and self.palette == other.palette and \
+            np.array_equal(self.counts, other.counts)
+
+    def __hash__(self) -> int:
+        return self.hash
+
+class RowMultiSet:
+    """
+    A frozen multiset of multisets, such as the rows of a coloring pooled by
+    `pool_vs`. All inner multisets draw their elements from the sorted tuple
+    `palette`: `rows` holds the distinct inner multisets as sorted rows of
+    indices into `palette`, in lexicographic order, and `counts` their
+    multiplicities. The hash is computed once, and again on unpickling since
+    it depends on the process.
+    """
+    __slots__ = ('palette', 'rows', 'counts', 'hash')
+
+    def __init__(self, palette: Tuple, rows: np.ndarray, counts: np.ndarray):
+        self.palette = palette
+        self.rows = rows.astype(np.int64)
+        self.counts = counts.astype(np.int64)
+        self.hash = hash((palette, self.rows.shape, self.rows.tobytes(),
+                          self.counts.tobytes()))
+
+    def __reduce__(self):
+        return (RowMultiSet, (self.palette, self.rows, self.counts))
+
+    @staticmethod
+    def from_matrix(color_list: np.ndarray, num_rows: int,
+                    transpose: bool = False,
+                    weights: Optional[np.ndarray] = None) -> "RowMultiSet":
+        """
+        The multiset of the rows of `color_list` reshaped to `num_rows` rows
+        (of columns if `transpose`), each taken as a multiset of signatures.
+        The i-th row is counted `weights[i]` times if given.
+
+        Rows are sorted and deduplicated with NumPy, after replacing the
+        signatures by their indices in the palette.
+        """
+        palette, rank = palette_rank(color_list)
+        rank = rank.reshape(num_rows, -1) if num_rows \
+            else np.zeros((0, 0), dtype=np.int64)
+        if transpose:
+            rank = rank.T
+        rank = np.sort(rank, axis=1)
+        row_id = dense_rank(rank)
+        rows = np.empty((int(row_id.max(initial=-1)) + 1, rank.shape[1]),
+                        dtype=np.int64)
+        rows[row_id] = rank
+        return RowMultiSet(palette, rows, np.bincount(
+            row_id, weights, minlength=rows.shape[0]
+        ))
+
+    @property
+    def contents(self) -> Dict[FrozenMultiSet, int]:
+        return {FrozenMultiSet.from_iterable(self.palette[i] for i in row): cnt
+                for (row, cnt) in zip(self.rows.tolist(),
+                                      self.counts.tolist())}
+
+    def __len__(self) -> int:
+        return int(self.counts.sum())
+
+    def __repr__(self) -> str:
+        return repr(self.contents)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, RowMultiSet) and \
+            self.hash == other.hash and self.palette == other.palette and \
+            np.array_equal(self.rows, other.rows) and \
+            np.array_equal(self.counts, other.counts)
+
+    def __hash__(self) -> int:
+        return self.hash
+
+# The types of graph representations returned by `pool_colors()`.
+Representation = Union[MultiSet, ArrayMultiSet, RowMultiSet]
@@ -1,3 +1,6 @@
+from .base import *
+from .profile import *
 from .wl1 import *
+from .wl2base import *
 from .wl2impl import *
 from .i2wl import *
\ No newline at end of file
@@ -1,7 +1,10 @@
 import numpy as np
-from ..utils import MultiSet, AdjList
-from typing import Literal
-from scipy.stats import rankdata
+import tracemalloc
+from ..utils import Representation, CSRAdj, dense_rank, same_partition, fingerprint
+from .profile import WLProfile
+from typing import Callable, Dict, List, Literal, Optional, Type, TypeVar
+
+T = TypeVar('T')
 
 class BaseWL:
     """
@@ -31,12 +34,27 @@ class BaseWL:
         * `aggregate_colors()` should return a numpy array storing the result
         of color aggregation. It will be then sorted and only the rank will
         be kept as the updated colors. Notice that this method can return an
-        array with **ANY** element type; even `object`-arrays are okay.
+        array with **ANY** element type; even `object`-arrays are okay. A 2D
+        integer array is also accepted, in which case each row is regarded
+        as the signature of one entry and ranking is done by lexsorting.
         * `pool_colors()` should take the stable coloring as input, and return 
         the representation of the graph.
+
+    Signatures are turned into colors by `self.relabel`, which defaults to
+    `dense_rank`. It can be replaced, e.g. by a `SharedColorTable` or a
+    `HashRelabel`, to make colors of several solvers comparable with each
+    other.
+
+    Set `self.memory_report` to a list to record, for every round, the peak
+    memory allocated during the round and the size of the colors. Set
+    `self.profile` to a `WLProfile` to record where the time goes (see
+    `profiled()`); when it is `None`, nothing is recorded.
     """
     def __init__(self):
         self.color: np.ndarray
+        self.relabel: Callable[[np.ndarray], np.ndarray] = dense_rank
+        self.memory_report: Optional[List[Dict[str, int]]] = None
+        self.profile: Optional[WLProfile] = None
 
     def initialize_colors(self, *args, **kwargs):
         """
@@ -51,7 +69,7 @@ class BaseWL:
         """
         raise NotImplementedError()
     
-    def pool_colors(self, coloring) -> MultiSet:
+    def pool_colors(self, coloring) -> Representation:
         """
         Define the rule to pool colors into a representation of the graph.
         """
@@ -59,20 +77,21 @@ class BaseWL:
 
     def update_colors(self):
         color_list = self.aggregate_colors()
-        self.color = (rankdata(color_list, method='dense') - 1).astype(np.int64)
+        self.color = self.profiled('relabel', self.relabel, color_list)
 
     def set_graph(self, graph, 
                   format: Literal['adj', 'dense', 'sparse'] = 'adj'):
+        """
+        Set the graph to be tested. With `format='adj'`, `graph` is either 
+        an `AdjList` or a `CSRAdj`. The graph is always stored as a `CSRAdj`
+        in `self.graph`.
+        """
         if format == 'adj':
-            self.graph: AdjList = graph
+            self.graph: CSRAdj = CSRAdj.from_adj(graph)
         elif format == 'dense':
-            self.graph = AdjList.from_dense_adj(graph)
+            self.graph = CSRAdj.from_dense_adj(graph)
         elif format == 'sparse':
-            self.graph = AdjList.from_sparse_adj(graph)
-        
-        for i in range(self.graph.num_nodes):
-            if i not in self.graph.adj_dict:
-                self.graph.adj_dict[i] = set()
+            self.graph = CSRAdj.from_sparse_adj(graph)
 
     def update_colors_test_stable(self):
         """
@@ -80,17 +99,94 @@ class BaseWL:
         reached.
         """
         old_color = self.color
-        self.update_colors()
-        if np.all(old_color == self.color):
-            return True
-        return False
+        self.track_round(self.update_colors)
+        return self.is_stable(old_color, self.color)
+
+    def track_round(self, update: Callable[[], T],
+                    color: Optional[Callable[[], np.ndarray]] = None) -> T:
+        """
+        Run one round `update()` and return its result. If
+        `self.memory_report` is set, the memory usage of the round is
+        appended to it, as traced by `tracemalloc`. If `self.profile` is
+        set, the round is recorded there. `color()` returns the colors after
+        the round, `self.color` by default.
+        """
+        color = color or (lambda: self.color)
+        if self.profile is None:
+            return self.trace_round(update, color)
+        with self.profile.section('round') as call:
+            result = self.trace_round(update, color)
+        self.profile.add_round(call, int(np.unique(color()).shape[0]))
+        return result
+
+    def trace_round(self, update: Callable[[], T],
+                    color: Callable[[], np.ndarray]) -> T:
+        if self.memory_report is None:
+            return update()
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        if self.profile is not None and self.profile.frames:
+            self.profile.fold_peak()
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        result = update()
+        _, peak = tracemalloc.get_traced_memory()
+        if not tracing:
+            tracemalloc.stop()
+        self.memory_report.append({'round': len(self.memory_report),
+                                   'peak_bytes': peak - base,
+                                   'color_bytes': color().nbytes})
+        return result
+
+    def profiled(self, name: str, fn: Callable[..., T], *args,
+                 **kwargs) -> T:
+        """
+        Return `fn(*args, **kwargs)`, recorded as section `name` of
+        `self.profile` if set.
+        """
+        if self.profile is None:
+            return fn(*args, **kwargs)
+        with self.profile.section(name):
+            return fn(*args, **kwargs)
+
+    def is_stable(self, old_color: np.ndarray, new_color: np.ndarray) -> bool:
+        """
+        Test whether an update from `old_color` to `new_color` has reached a
+        stable coloring. Dense ranks are canonical and are compared directly;
+        other labels (e.g. hashes) may change every round, so the partitions
+        are compared instead.
+        """
+        if self.relabel is dense_rank:
+            return bool(np.all(old_color == new_color))
+        return same_partition(old_color, new_color)
     
     def get_stable_coloring(self):
         while not self.update_colors_test_stable(): pass
-        return self.aggregate_colors()
+        return self.profiled('final_aggregate', self.aggregate_colors)
         
-    def representation(self) -> MultiSet:
+    def representation(self) -> Representation:
         """
         Return the multiset of stable coloring.
         """
-        return self.pool_colors(self.get_stable_coloring())
+        coloring = self.get_stable_coloring()
+        return self.profiled('pool_colors', self.pool_colors, coloring)
+
+    def fingerprint(self) -> str:
+        """
+        Return a 128-bit hex digest of `representation()`. Together with 
+        `HashRelabel` colors, it can be compared across graphs, runs and 
+        processes.
+        """
+        return fingerprint(self.representation())
+
+# Solver classes by method name, see `register()`.
+METHOD_REGISTRY: Dict[str, Type[BaseWL]] = {}
+
+def register(cls: Type[BaseWL]) -> Type[BaseWL]:
+    """
+    Class decorator which makes a solver available by its class name, e.g.
+    to `comparer.wl_test()`.
+    """
+    METHOD_REGISTRY[cls.__name__] = cls
+    return cls
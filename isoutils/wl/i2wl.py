@@ -1,22 +1,42 @@
 import numpy as np
-from ..utils import MultiSet, FrozenMultiSet
-from .base import BaseWL
+from ..utils import RowMultiSet, dense_rank
+from .base import BaseWL, register
 from typing import Literal, Optional
-from scipy.stats import rankdata
 
+@register
 class I2WL(BaseWL):
-    def __init__(self):
+    """
+    I2WL solver, which colors every (edge, node) pair.
+
+    By default, rounds are vectorized over the CSR layout of the graph: the
+    colors of all neighbors of all nodes are gathered for every edge at
+    once, and sorted segment by segment. Set `engine='loop'` to use Python
+    loops instead (only for graphs in sparse format).
+
+    Set `symmetric=True` to refine only one direction of every edge if the
+    graph is undirected and there is no precolor. Both directions always
+    get the same row of colors, so rows are counted twice when pooling,
+    and the representation is unchanged.
+    """
+    def __init__(self, engine: Literal['loop', 'vectorized'] = 'vectorized',
+                 symmetric: bool = False):
         super().__init__()
-    
+        self.engine = engine
+        self.symmetric = symmetric
+
     def set_graph(self, graph, format: Literal['adj', 'dense', 'sparse'] = 'adj'):
         super().set_graph(graph, format)
         if format == 'sparse':
             self.edge_index = graph
-        else:
+        elif self.engine == 'loop':
             raise RuntimeError('Unsupported graph format!')
 
     def initialize_colors(self, identity: bool = True,
                           precolor: Optional[np.ndarray] = None):
+        if self.engine != 'loop':
+            return self.initialize_colors_vectorized(identity, precolor)
+
+        self.multiplicity = None
         self.color = np.zeros((self.graph.num_edges, self.graph.num_nodes),
                               dtype=object)
         for e_i, (i, j) in enumerate(self.edge_index.T):
@@ -28,29 +48,99 @@ class I2WL(BaseWL):
                         color_e_i_k = [0]
                 else:
                     color_e_i_k = [0]
-                
+
                 if precolor is not None:
                     color_e_i_k += [precolor[i], precolor[j], precolor[k]]
                 self.color[e_i][k] = tuple(color_e_i_k)
-            
+
         self.color = self.color.reshape(-1)
-        self.color = (rankdata(self.color, method='dense') - 1).astype(np.int64)
+        self.color = self.relabel(self.color)
+
+    def initialize_colors_vectorized(self, identity: bool,
+                                     precolor: Optional[np.ndarray]):
+        src, tgt = self.graph.sources(), self.graph.indices
+        self.multiplicity = np.ones((src.shape[0], ), dtype=np.int64)
+        if self.symmetric and precolor is None and self.is_undirected():
+            keep = src <= tgt
+            src, tgt = src[keep], tgt[keep]
+            self.multiplicity = np.where(src == tgt, 1, 2)
+        self.src, self.tgt = src, tgt
+
+        nodes = np.arange(self.graph.num_nodes, dtype=np.int64)[None, :]
+        shape = (src.shape[0], self.graph.num_nodes)
+        color_ek = [(nodes == src[:, None]) | (nodes == tgt[:, None])]
+        if not identity:
+            color_ek[0] = np.zeros(shape, dtype=bool)
+        if precolor is not None:
+            precolor = np.asarray(precolor, dtype=np.int64)
+            color_ek += [np.broadcast_to(precolor[src][:, None], shape),
+                         np.broadcast_to(precolor[tgt][:, None], shape),
+                         np.broadcast_to(precolor[None, :], shape)]
+        self.color = self.relabel(np.stack(
+            [color.reshape(-1).astype(np.int64) for color in color_ek], axis=1
+        ))
+
+    def is_undirected(self) -> bool:
+        reverse = self.graph.reverse()
+        return np.array_equal(reverse.indptr, self.graph.indptr) and \
+            np.array_equal(reverse.indices, self.graph.indices)
+
+    def aggregate_colors(self, exact: bool = False):
+        """
+        Set `exact=True` to get the very same signatures as the loop engine,
+        e.g. for pooling. Otherwise, signatures are rows of a padded integer
+        table, which are ranked like the exact signatures.
+        """
+        if self.engine == 'loop':
+            return self.aggregate_colors_loop()
+
+        num_nodes = self.graph.num_nodes
+        color = self.color.reshape(-1, num_nodes)
+        owner = self.graph.sources()
+        offset = np.arange(owner.shape[0]) - self.graph.indptr[owner]
+
+        # Sort neighbor colors within the segment of every node, by sorting
+        # keys which order segments first.
+        palette, rank = np.unique(color, return_inverse=True)
+        rank = rank.reshape(color.shape)
+        keys = owner[None, :] * palette.shape[0] + rank[:, self.graph.indices]
+        keys.sort(axis=1)
+        values = palette[keys - owner[None, :] * palette.shape[0]]
+
+        width = int(self.graph.degree.max(initial=0)) + 1
+        table = np.full((color.shape[0], num_nodes, width),
+                        color.min(initial=0) - 1, dtype=np.int64)
+        table[:, :, 0] = color
+        table[:, owner, offset + 1] = values
+        table = table.reshape(-1, width)
+
+        if not (exact or self.relabel is not dense_rank):
+            return table
+        lengths = np.tile(self.graph.degree + 1, color.shape[0]).tolist()
+        signatures = np.empty((table.shape[0], ), dtype=object)
+        signatures[:] = [tuple(row[:length]) for row, length
+                         in zip(table.tolist(), lengths)]
+        return signatures
 
-    def aggregate_colors(self):
-        color_list = np.zeros((self.graph.num_edges, self.graph.num_nodes), 
+    def aggregate_colors_loop(self):
+        color_list = np.zeros((self.graph.num_edges, self.graph.num_nodes),
                               dtype=object)
         for e_i in range(self.graph.num_edges):
             for node in range(self.graph.num_nodes):
                 color_list[e_i][node] = tuple(np.concatenate(
                     [np.array([self.color.reshape(-1, self.graph.num_nodes)[e_i][node]], dtype=np.int64),
-                     np.sort(self.color.reshape(-1, self.graph.num_nodes)[e_i][list(self.graph.adj_dict[node])])]
+                     np.sort(self.color.reshape(-1, self.graph.num_nodes)[e_i][self.graph.neighbors(node)])]
                 ))
         return color_list
-    
-    def pool_colors(self, coloring):
-        return MultiSet.from_iterable(
-            [FrozenMultiSet.from_iterable(row) for row in coloring.reshape(-1, self.graph.num_nodes)]
-        )
 
+    def get_stable_coloring(self):
+        if self.engine == 'loop':
+            return super().get_stable_coloring()
+        while not self.update_colors_test_stable(): pass
+        return self.profiled('final_aggregate', self.aggregate_colors,
+                             exact=True)
 
-        
+    def pool_colors(self, coloring) -> RowMultiSet:
+        return RowMultiSet.from_matrix(coloring, coloring.size //
+                                       self.graph.num_nodes,
+                                       weights=self.multiplicity)
@@ -0,0 +1,223 @@
+import numpy as np
+from ..utils import dense_rank
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+class SignatureKernel:
+    """
+    Computes the aggregated colors of a `WL2Base` method in one pass, given
+    the method's `operators`.
+
+    The pointwise, global and local operators (see `FUSED_OPERATORS`) are
+    compiled into steps which share intermediates within a round: one
+    diagonal for `pointwise_uu` and `pointwise_vv`, one row (column) sort for
+    `global_u` (`global_v`), and one neighbor gather per side for `local_u`
+    and `local_v`. The local FWL operators and `n2_fwl2` gather the colors
+    of all neighbors (pairs of neighbors) by fancy indexing instead of
+    Python loops, packing every tuple of colors into one integer. Other
+    operators are called on the solver as usual.
+
+    With `exact=False`, every fused operator contributes one integer column,
+    the dense rank of its signature among the computed pairs. Ranks preserve
+    the order of signatures, so the rows are ranked exactly like the tuples
+    built by `WL2Base.color_concat()`, but the ranks of two solvers are not
+    comparable. With `exact=True`, the fused operators produce the very same
+    signatures as the operators they replace.
+    """
+    FUSED_OPERATORS = ('pointwise_uv', 'pointwise_vu', 'pointwise_uu',
+                       'pointwise_vv', 'global_u', 'global_v', 'local_u',
+                       'local_v', 'local_u_fwl2', 'local_v_fwl2',
+                       'local_uv_fwl2', 'n2_fwl2')
+
+    def __init__(self, operators: Sequence[str]):
+        self.operators = tuple(operators)
+        self.steps: List[Tuple[str, bool]] = [
+            (op, op in self.FUSED_OPERATORS) for op in self.operators
+        ]
+
+    def __call__(self, solver, exact: bool = False) -> np.ndarray:
+        intermediates = KernelRound(solver)
+        colors = [
+            solver.profiled(op, intermediates.compute, op, exact) if fused
+            else solver.get_operator(op)() for (op, fused) in self.steps
+        ]
+        return solver.profiled('color_concat', solver.color_concat, *colors)
+
+class KernelRound:
+    """
+    Lazily computed intermediates of one round of a `SignatureKernel`.
+    """
+    def __init__(self, solver):
+        self.num_nodes = solver.graph.num_nodes
+        self.graph = solver.graph
+        self.union_graph = getattr(solver, 'union_graph', None)
+        self.color = solver.color
+        self.C = solver.to2d(solver.color)
+        self.pairs = solver.pairs()
+        self.cache: Dict[str, object] = {}
+
+    def get(self, name: str, fn: Callable[[], object]):
+        if name not in self.cache:
+            self.cache[name] = fn()
+        return self.cache[name]
+
+    def u(self) -> np.ndarray:
+        return self.get('u', lambda: self.pairs // self.num_nodes)
+
+    def v(self) -> np.ndarray:
+        return self.get('v', lambda: self.pairs % self.num_nodes)
+
+    def diag(self) -> np.ndarray:
+        return self.get('diag', lambda: np.diagonal(self.C))
+
+    def compute(self, op: str, exact: bool) -> np.ndarray:
+        return getattr(self, op)(exact)
+
+    def pointwise_uv(self, exact: bool) -> np.ndarray:
+        return self.color[self.pairs]
+
+    def pointwise_vu(self, exact: bool) -> np.ndarray:
+        return self.C[self.v(), self.u()]
+
+    def pointwise_uu(self, exact: bool) -> np.ndarray:
+        return self.diag()[self.u()]
+
+    def pointwise_vv(self, exact: bool) -> np.ndarray:
+        return self.diag()[self.v()]
+
+    def sorted_lines(self, lines: np.ndarray, index: np.ndarray,
+                     exact: bool) -> np.ndarray:
+        """
+        Signatures of sorted rows of `lines`, indexed by `index`.
+        """
+        lines = np.sort(lines, axis=1)
+        if not exact:
+            return dense_rank(lines)[index]
+        signatures = np.empty((lines.shape[0], ), dtype=object)
+        signatures[:] = list(map(tuple, lines.tolist()))
+        return signatures[index]
+
+    def global_u(self, exact: bool) -> np.ndarray:
+        return self.sorted_lines(self.C, self.u(), exact)
+
+    def global_v(self, exact: bool) -> np.ndarray:
+        return self.sorted_lines(self.C.T, self.v(), exact)
+
+    def sorted_segments(self, centrals: np.ndarray, fixed: np.ndarray,
+                        transpose: bool, exact: bool) -> np.ndarray:
+        """
+        For every pair, the sorted colors of `(fixed, w)` (or `(w, fixed)`
+        if `transpose`) over the neighbors w of `centrals`.
+        """
+        owner, nbrs = self.graph.gather(centrals)
+        values = self.C[nbrs, fixed[owner]] if transpose \
+            else self.C[fixed[owner], nbrs]
+        return self.sorted_multisets(owner, values,
+                                     self.graph.degree[centrals], exact)
+
+    def sorted_multisets(self, owner: np.ndarray, values: np.ndarray,
+                         sizes: np.ndarray, exact: bool,
+                         items: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        For every pair i, the signature of the multiset of the `sizes[i]`
+        `values` owned by i (`owner` is sorted), as the sorted tuple of
+        values. With `items`, the tuple holds the rows of `items` instead,
+        which `values` rank.
+        """
+        low = int(values.min(initial=0))
+        span = int(values.max(initial=0)) - low + 1
+        if not exact and span * sizes.shape[0] < 2 ** 63:
+            # Sort once by (owner, value), combined into one integer key.
+            values = np.sort(owner * span + (values - low)) % span + low
+        else:
+            order = np.lexsort((values, owner))
+            values = values[order]
+        offset = np.cumsum(sizes) - sizes
+
+        if exact:
+            items = values.tolist() if items is None \
+                else list(map(tuple, items[order].tolist()))
+            signatures = np.empty((sizes.shape[0], ), dtype=object)
+            signatures[:] = [tuple(items[s:s + d]) for (s, d)
+                             in zip(offset.tolist(), sizes.tolist())]
+            return signatures
+
+        # Pad below the smallest color, so that lexsorting the rows ranks
+        # them like tuples of varying length.
+        width = int(sizes.max(initial=0))
+        if width == 0:
+            return np.zeros((sizes.shape[0], ), dtype=np.int64)
+        table = np.full((sizes.shape[0], width),
+                        values.min(initial=0) - 1, dtype=np.int64)
+        table[owner, np.arange(owner.shape[0]) - offset[owner]] = values
+        return dense_rank(table)
+
+    def local_u(self, exact: bool) -> np.ndarray:
+        return self.sorted_segments(self.v(), self.u(), False, exact)
+
+    def local_v(self, exact: bool) -> np.ndarray:
+        return self.sorted_segments(self.u(), self.v(), True, exact)
+
+    def packed_multisets(self, owner: np.ndarray, sizes: np.ndarray,
+                         lookups: Sequence[Tuple[np.ndarray, np.ndarray]],
+                         exact: bool) -> np.ndarray:
+        """
+        For every pair i, the multiset of the tuples of colors
+        `(C[x, y] for (x, y) in lookups)` owned by i (see
+        `sorted_multisets()`). Tuples are packed into one integer in base
+        `num_colors` if that fits into 64 bits, or into their dense rank
+        otherwise.
+        """
+        num_colors = int(self.C.max(initial=0)) + 1
+        items = np.stack([self.C[x, y] for (x, y) in lookups], axis=1) \
+            if exact else None
+        if self.C.min(initial=0) < 0 or \
+                num_colors ** len(lookups) >= 2 ** 63:
+            if items is None:
+                items = np.stack([self.C[x, y] for (x, y) in lookups], axis=1)
+            return self.sorted_multisets(owner, dense_rank(items), sizes,
+                                         exact, items)
+        codes = np.zeros((owner.shape[0], ), dtype=np.int64)
+        for (x, y) in lookups:
+            codes *= num_colors
+            codes += self.C[x, y]
+        return self.sorted_multisets(owner, codes, sizes, exact, items)
+
+    def local_fwl2(self, graph, centrals: np.ndarray,
+                   exact: bool) -> np.ndarray:
+        """
+        For every pair (u, v), the multiset of (h(u, w), h(w, v)) over the
+        neighbors w of `centrals` in `graph`.
+        """
+        owner, w = graph.gather(centrals)
+        u, v = self.u()[owner], self.v()[owner]
+        return self.packed_multisets(owner, graph.degree[centrals],
+                                     ((u, w), (w, v)), exact)
+
+    def local_u_fwl2(self, exact: bool) -> np.ndarray:
+        return self.local_fwl2(self.graph, self.u(), exact)
+
+    def local_v_fwl2(self, exact: bool) -> np.ndarray:
+        return self.local_fwl2(self.graph, self.v(), exact)
+
+    def local_uv_fwl2(self, exact: bool) -> np.ndarray:
+        return self.local_fwl2(self.union_graph, self.pairs, exact)
+
+    def n2_fwl2(self, exact: bool) -> np.ndarray:
+        """
+        For every pair (u, v), the multiset of (h(u, w), h(w, v), h(u, z),
+        h(z, v), h(w, z)) over w in N(v) and z in N(u). The products N(v) x
+        N(u) of all pairs are laid out one after the other.
+        """
+        u, v = self.u(), self.v()
+        degree, indptr = self.graph.degree, self.graph.indptr
+        sizes = degree[v] * degree[u]
+        owner = np.repeat(np.arange(sizes.shape[0], dtype=np.int64), sizes)
+        index = np.arange(owner.shape[0]) - np.repeat(np.cumsum(sizes) - sizes,
+                                                      sizes)
+        w_index, z_index = np.divmod(index, degree[u][owner])
+        w = self.graph.indices[indptr[v][owner] + w_index]
+        z = self.graph.indices[indptr[u][owner] + z_index]
+        pu, pv = u[owner], v[owner]
+        return self.packed_multisets(
+            owner, sizes, ((pu, w), (w, pv), (pu, z), (z, pv), (w, z)), exact
+        )
@@ -0,0 +1,162 @@
+import numpy as np
+import atexit
+import copy
+import pickle
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing.reduction import ForkingPickler
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, Iterator, List, Literal, Optional, Tuple
+
+# Process pools by number of workers, shared by all solvers of a process.
+_executors: Dict[int, ProcessPoolExecutor] = {}
+
+# The solver of a worker process, whose colors live in shared memory, and
+# the shared segments (colors, pickled solver) it was loaded from.
+_solver = None
+_segments: List[SharedMemory] = []
+
+def _init_worker():
+    # Signatures hold NumPy integers, which are slow to pickle back.
+    for dtype in (np.int8, np.int16, np.int32, np.int64,
+                  np.uint8, np.uint16, np.uint32, np.uint64):
+        ForkingPickler.register(dtype, lambda x: (int, (int(x), )))
+
+def shared_executor(workers: int) -> ProcessPoolExecutor:
+    """
+    Return the pool of `workers` processes, which is started on first use
+    and kept until `shutdown_executors()` or the end of the process.
+    """
+    if workers not in _executors:
+        _executors[workers] = ProcessPoolExecutor(workers,
+                                                  initializer=_init_worker)
+    return _executors[workers]
+
+@atexit.register
+def shutdown_executors():
+    for executor in _executors.values():
+        executor.shutdown()
+    _executors.clear()
+
+def _load_solver(names: Tuple[str, str], template_size: int):
+    global _solver
+    _solver = None
+    for segment in _segments:
+        segment.close()
+    _segments[:] = [SharedMemory(name) for name in names]
+    color, template = _segments
+    _solver = pickle.loads(bytes(template.buf[:template_size]))
+    _solver.color = np.ndarray((_solver.graph.num_nodes ** 2, ),
+                               dtype=np.int64, buffer=color.buf)
+
+def _aggregate_chunk(names: Tuple[str, str], template_size: int,
+                     pairs: np.ndarray) -> np.ndarray:
+    if [segment.name for segment in _segments] != list(names):
+        _load_solver(names, template_size)
+    _solver.active_pairs = pairs
+    return _solver.aggregate_block(exact=True)
+
+class ChunkedAggregator:
+    """
+    Aggregates the colors of a `WL2Base` solver over blocks of `chunk_size`
+    rows of the color matrix, spread over `workers` threads or processes.
+    By default, each worker gets about four blocks per round.
+
+    With `pool='process'`, blocks go to the pool of `shared_executor()`,
+    which is reused across graphs and solvers. For every graph, the solver
+    and the color matrix are put in shared memory, from which workers load
+    them once and read the colors of each round, so that only the pairs of
+    a block are sent to them. Blocks return exact signatures (see
+    `SignatureKernel`), which are concatenated for relabeling. Call
+    `release()` once the graph is refined; `WL2Base.get_stable_coloring()`
+    does so.
+    """
+    def __init__(self, workers: int, chunk_size: Optional[int] = None,
+                 pool: Literal['thread', 'process'] = 'process'):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.pool = pool
+        self.executor: Optional[Executor] = None
+        self.segments: List[SharedMemory] = []
+        self.template_size = 0
+        self.graph = None
+
+    def chunks(self, solver) -> List[np.ndarray]:
+        pairs = solver.pairs()
+        num_nodes = solver.graph.num_nodes
+        chunk_size = self.chunk_size or \
+            max(1, -(-num_nodes // (4 * self.workers)))
+        step = chunk_size * num_nodes
+        return [pairs[i:i + step] for i in range(0, pairs.shape[0], step)]
+
+    def start(self, solver):
+        """
+        Put the graph of `solver` in shared memory for the worker processes.
+        """
+        self.release()
+        template = copy.copy(solver)
+        template.parallel = None
+        template.profile = None
+        template.active_pairs = None
+        del template.color
+        template = pickle.dumps(template)
+        self.template_size = len(template)
+        self.segments = [
+            SharedMemory(create=True,
+                         size=max(1, solver.graph.num_nodes ** 2) * 8),
+            SharedMemory(create=True, size=max(1, self.template_size))
+        ]
+        self.segments[1].buf[:self.template_size] = template
+        self.color = np.ndarray((solver.graph.num_nodes ** 2, ),
+                                dtype=np.int64, buffer=self.segments[0].buf)
+        self.executor = shared_executor(self.workers)
+        self.graph = solver.graph
+
+    def release(self):
+        """
+        Free the shared memory of the current graph, and the threads of a
+        thread pool. Process pools are shared and kept.
+        """
+        if isinstance(self.executor, ThreadPoolExecutor):
+            self.executor.shutdown()
+        self.executor = None
+        self.color = None
+        for segment in self.segments:
+            segment.close()
+            segment.unlink()
+        self.segments = []
+        self.graph = None
+
+    def __del__(self):
+        self.release()
+
+    def __call__(self, solver) -> np.ndarray:
+        return np.concatenate(list(self.imap(solver)), axis=0)
+
+    def imap(self, solver) -> Iterator[np.ndarray]:
+        """
+        Yield the signatures of the blocks in order.
+        """
+        chunks = self.chunks(solver)
+        if self.pool == 'thread':
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(self.workers)
+            return self.executor.map(self.aggregate_thread,
+                                     [solver] * len(chunks), chunks)
+        if self.graph is not solver.graph:
+            self.start(solver)
+        self.color[:solver.color.shape[0]] = solver.color
+        names = tuple(segment.name for segment in self.segments)
+        return self.executor.map(_aggregate_chunk, [names] * len(chunks),
+                                 [self.template_size] * len(chunks), chunks)
+
+    @staticmethod
+    def aggregate_thread(solver, pairs: np.ndarray) -> np.ndarray:
+        worker = copy.copy(solver)
+        worker.parallel = None
+        worker.profile = None
+        worker.active_pairs = pairs
+        return worker.aggregate_block(exact=True)
+
+    def __getstate__(self):
+        return {**self.__dict__, 'executor': None, 'segments': [],
+                'graph': None, 'color': None}
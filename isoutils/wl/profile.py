@@ -0,0 +1,93 @@
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+
+class WLProfile:
+    """
+    Statistics of solver runs, recorded when set as `solver.profile`:
+        * for every section, i.e. every operator, `color_concat`, `relabel`,
+        the `final_aggregate` of `get_stable_coloring()` and `pool_colors`,
+        the number of calls and their total wall time;
+        * for every round, its wall time and the number of color classes
+        after it. The last round is the one which finds the coloring stable.
+
+    With `trace_memory=True`, the largest peak of memory allocated during a
+    call (or a round) is recorded as well, as traced by `tracemalloc`, which
+    slows down the run. Nested sections are traced correctly.
+
+    Use `to_dict()`, `to_json()` or `dump()` to export the statistics.
+    """
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.sections: Dict[str, Dict[str, float]] = {}
+        self.rounds: List[Dict[str, float]] = []
+        # [base, peak] of the open sections, when tracing memory.
+        self.frames: List[List[int]] = []
+        self.started = False
+
+    @contextmanager
+    def section(self, name: str) -> Iterator[Dict[str, float]]:
+        """
+        Record the code run within the context under `name`. Yields the
+        record of this call, which is filled on exit.
+        """
+        call: Dict[str, float] = {}
+        if self.trace_memory:
+            self.enter_trace()
+        start = time.perf_counter()
+        try:
+            yield call
+        finally:
+            call['seconds'] = time.perf_counter() - start
+            if self.trace_memory:
+                call['peak_bytes'] = self.exit_trace()
+            stats = self.sections.setdefault(name,
+                                             {'calls': 0, 'seconds': 0.})
+            stats['calls'] += 1
+            stats['seconds'] += call['seconds']
+            if self.trace_memory:
+                stats['peak_bytes'] = max(stats.get('peak_bytes', 0),
+                                          call['peak_bytes'])
+
+    def add_round(self, call: Dict[str, float], num_classes: int):
+        self.rounds.append({'round': len(self.rounds), **call,
+                            'num_classes': num_classes})
+
+    def fold_peak(self):
+        """
+        Fold the traced peak into the open sections. Call this before
+        `tracemalloc.reset_peak()`.
+        """
+        _, peak = tracemalloc.get_traced_memory()
+        for frame in self.frames:
+            frame[1] = max(frame[1], peak)
+
+    def enter_trace(self):
+        if not self.frames and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started = True
+        self.fold_peak()
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        self.frames.append([current, current])
+
+    def exit_trace(self) -> int:
+        self.fold_peak()
+        base, peak = self.frames.pop()
+        if not self.frames and self.started:
+            tracemalloc.stop()
+            self.started = False
+        return peak - base
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'num_rounds': len(self.rounds), 'rounds': self.rounds,
+                'sections': self.sections}
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def dump(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=1)
@@ -0,0 +1,98 @@
+import numpy as np
+from collections import deque
+from ..utils import CSRAdj, dense_rank
+
+def equitable_partition(graph: CSRAdj, color: np.ndarray) -> np.ndarray:
+    """
+    Return the coarsest partition of nodes which refines `color`, and in
+    which any two nodes of the same class have equally many neighbors in
+    every class. This is exactly the stable partition of WL1.
+
+    Classes are split by Hopcroft's strategy: when a class which is not
+    waiting in the queue splits, all but its largest part are enqueued. Each
+    split only touches the nodes adjacent to the splitter, so the algorithm
+    runs in O((n + m) log n) time.
+
+    The returned class ids carry no canonical meaning.
+    """
+    num_nodes = graph.num_nodes
+    reverse = graph.reverse()
+    cls = dense_rank(np.asarray(color))
+
+    # Nodes of class c are `order[start[c]:end[c]]`; `pos` inverts `order`.
+    order = np.argsort(cls, kind='stable')
+    pos = np.empty((num_nodes, ), dtype=np.int64)
+    pos[order] = np.arange(num_nodes, dtype=np.int64)
+    sizes = np.bincount(cls)
+    num_classes = sizes.shape[0]
+    start = np.zeros((num_nodes, ), dtype=np.int64)
+    end = np.zeros((num_nodes, ), dtype=np.int64)
+    end[:num_classes] = np.cumsum(sizes)
+    start[:num_classes] = end[:num_classes] - sizes
+
+    queue = deque(range(num_classes))
+    in_queue = np.zeros((num_nodes, ), dtype=bool)
+    in_queue[:num_classes] = True
+
+    while queue:
+        splitter = queue.popleft()
+        in_queue[splitter] = False
+        _, preds = reverse.gather(order[start[splitter]:end[splitter]])
+        if preds.shape[0] == 0:
+            continue
+
+        nodes, counts = np.unique(preds, return_counts=True)
+        perm = np.lexsort((counts, cls[nodes]))
+        nodes, counts = nodes[perm], counts[perm]
+
+        # Group the touched nodes by class, and keep the classes which split,
+        # i.e. are touched partially or with different counts.
+        bounds = np.flatnonzero(np.diff(cls[nodes])) + 1
+        group_start = np.concatenate([[0], bounds])
+        group_end = np.concatenate([bounds, [nodes.shape[0]]])
+        group_cls = cls[nodes[group_start]]
+        splits = (group_end - group_start < end[group_cls] - start[group_cls]) \
+            | (counts[group_start] != counts[group_end - 1])
+
+        for gs, ge, c in zip(group_start[splits].tolist(),
+                             group_end[splits].tolist(),
+                             group_cls[splits].tolist()):
+            touched, cnt = nodes[gs:ge], counts[gs:ge]
+            num_touched = ge - gs
+
+            # Move the touched nodes to the end of the class, sorted by count.
+            lo = end[c] - num_touched
+            old_pos = pos[touched]
+            inside = old_pos >= lo
+            occupied = np.zeros((num_touched, ), dtype=bool)
+            occupied[old_pos[inside] - lo] = True
+            displaced = order[lo + np.flatnonzero(~occupied)]
+            order[old_pos[~inside]] = displaced
+            pos[displaced] = old_pos[~inside]
+            order[lo:end[c]] = touched
+            pos[touched] = np.arange(lo, end[c], dtype=np.int64)
+
+            # Split into the untouched part and one part per count.
+            cuts = (lo + np.flatnonzero(np.diff(cnt)) + 1).tolist()
+            parts = list(zip([int(start[c]), lo] + cuts,
+                             [lo] + cuts + [int(end[c])]))
+            if parts[0][0] == parts[0][1]:
+                parts = parts[1:]
+            end[c] = parts[0][1]
+            new_classes = [c]
+            for (s, e) in parts[1:]:
+                start[num_classes], end[num_classes] = s, e
+                cls[order[s:e]] = num_classes
+                new_classes.append(num_classes)
+                num_classes += 1
+
+            if in_queue[c]:
+                enqueue = new_classes[1:]
+            else:
+                largest = max(new_classes, key=lambda x: end[x] - start[x])
+                enqueue = [x for x in new_classes if x != largest]
+            for x in enqueue:
+                in_queue[x] = True
+                queue.append(x)
+
+    return cls
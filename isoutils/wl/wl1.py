@@ -1,14 +1,26 @@
 import numpy as np
-from ..utils import MultiSet
-from .base import BaseWL
-from typing import Optional
+from ..utils import ArrayMultiSet, dense_rank
+from .base import BaseWL, register
+from .refine import equitable_partition
+from typing import Literal, Optional
 
+@register
 class WL1(BaseWL):
     """
     WL1 solver.
+
+    Set `engine='hopcroft'` to compute the stable partition by partition
+    refinement (see `equitable_partition()`) instead of round-by-round
+    updates. Both engines produce the same stable coloring: its labels
+    depend on the order in which classes split, so the R rounds are then
+    replayed on the quotient graph of the k classes and their m' <= m edges.
+    This takes O((n + m) log n + R (k + m') log m') time overall, not
+    O((n + m) log n): on a path, R and k are about n / 2, so the replay
+    dominates, though it is much cheaper than rounds over the full graph.
     """
-    def __init__(self):
+    def __init__(self, engine: Literal['loop', 'hopcroft'] = 'loop'):
         super().__init__()
+        self.engine = engine
     
     def initialize_colors(self, precolor: Optional[np.ndarray] = None):
         if precolor is not None:
@@ -21,9 +33,74 @@ class WL1(BaseWL):
         for node in range(self.graph.num_nodes):
             color_list[node] = tuple(np.concatenate(
                 [np.array([self.color[node]], dtype=np.int64),
-                 np.sort(self.color[list(self.graph.adj_dict[node])])]
+                 np.sort(self.color[self.graph.neighbors(node)])]
             ))
         return color_list
     
-    def pool_colors(self, coloring) -> MultiSet:
-        return MultiSet.from_iterable(coloring)
+    def get_stable_coloring(self):
+        if self.engine == 'loop':
+            return super().get_stable_coloring()
+
+        # Every round of WL1 colors each class of the stable partition
+        # uniformly, so the rounds can be replayed on the quotient graph with
+        # one representative node per class, yielding the same colors.
+        partition = self.profiled('equitable_partition', equitable_partition,
+                                  self.graph, self.color)
+        num_classes = int(partition.max()) + 1 if partition.size else 0
+        rep = np.zeros((num_classes, ), dtype=np.int64)
+        rep[partition] = np.arange(self.graph.num_nodes, dtype=np.int64)
+        owner, neighbors = self.graph.gather(rep)
+        neighbors = partition[neighbors]
+        degree = self.graph.degree[rep]
+        offset = np.repeat(np.cumsum(degree) - degree, degree)
+
+        # Signatures are rows of a table, padded below the smallest color so
+        # that lexsorting the rows ranks them like tuples of varying length.
+        # Fall back to tuples if the table would be much larger than the
+        # quotient graph, or if labels are not dense ranks, since e.g. hashes
+        # of padded rows would differ from hashes of tuples.
+        width = int(degree.max()) + 1 if num_classes else 1
+        use_table = self.relabel is dense_rank and \
+            num_classes * width <= 8 * (neighbors.shape[0] + num_classes)
+
+        def signatures(color: np.ndarray) -> np.ndarray:
+            values = color[neighbors]
+            values = values[np.lexsort((values, owner))]
+            if use_table:
+                color_list = np.full((num_classes, width), 
+                                     color.min(initial=0) - 1, dtype=np.int64)
+                color_list[:, 0] = color
+                color_list[owner, np.arange(owner.shape[0]) - offset + 1] = \
+                    values
+            else:
+                color_list = np.zeros((num_classes, ), dtype=object)
+                for c, row in enumerate(np.split(values,
+                                                 np.cumsum(degree)[:-1])):
+                    color_list[c] = (color[c], ) + tuple(row)
+            return color_list
+
+        def replay_round() -> bool:
+            nonlocal color, color_list
+            color_list = signatures(color)
+            new_color = self.profiled('relabel', self.relabel, color_list)
+            stable = self.is_stable(color, new_color)
+            color = new_color
+            return stable
+
+        color = np.asarray(self.color, dtype=np.int64)[rep]
+        while not self.track_round(replay_round, lambda: color): pass
+
+        # Labels other than dense ranks may change in the last round, so the
+        # signatures are rebuilt from the final colors, like `aggregate_colors()`.
+        if self.relabel is not dense_rank:
+            color_list = signatures(color)
+        if use_table:
+            rows = color_list.tolist()
+            color_list = np.zeros((num_classes, ), dtype=object)
+            color_list[:] = [tuple(row[:deg + 1]) for row, deg
+                             in zip(rows, degree.tolist())]
+        self.color = color[partition]
+        return color_list[partition]
+    
+    def pool_colors(self, coloring) -> ArrayMultiSet:
+        return ArrayMultiSet.from_array(coloring)
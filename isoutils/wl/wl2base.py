@@ -1,16 +1,104 @@
 import numpy as np
-from .base import BaseWL
-from ..utils import MultiSet, FrozenMultiSet
-from typing import Optional
-from scipy.stats import rankdata
+from .base import BaseWL, register
+from .kernel import SignatureKernel
+from .parallel import ChunkedAggregator
+from ..utils import ArrayMultiSet, CSRAdj, RowMultiSet, dense_rank, compact, as_hashable, mix64, encode
+from hashlib import blake2b
+from typing import Callable, Iterator, Literal, Optional, Tuple, Union
 from itertools import product
 
+# The operator giving, at (u, v), the aggregated colors of the operator at
+# (v, u), up to how colors of transposed pairs relate.
+TRANSPOSED_OPERATOR = {
+    'pointwise_uv': 'pointwise_uv',
+    'pointwise_vu': 'pointwise_vu',
+    'pointwise_uu': 'pointwise_vv',
+    'pointwise_vv': 'pointwise_uu',
+    'global_u': 'global_v',
+    'global_v': 'global_u',
+    'local_u': 'local_v',
+    'local_v': 'local_u',
+    'global_fwl2': 'global_fwl2',
+    'local_u_fwl2': 'local_v_fwl2',
+    'local_v_fwl2': 'local_u_fwl2',
+    'local_uv_fwl2': 'local_uv_fwl2',
+    'n2_fwl2': 'n2_fwl2',
+}
+
 class WL2Base(BaseWL):
     """
     Base solver for all WL(2)/FWL(2)-type algorithms.
+
+    A method is specified by `operators`, the names of the operations whose
+    results are concatenated as the aggregated color (the first one must be
+    `pointwise_uv`), and by `pooling`, one of 'all', 'vs' and 'sv'.
+
+    By default, the operators are compiled into a `SignatureKernel`, which
+    computes all of them in one pass; set `engine='loop'` to call them one
+    by one instead. Both engines produce the same stable coloring.
+
+    Set `incremental=True` to only recompute, in every round, the pairs
+    whose aggregation inputs touch a color class that split in the previous
+    round (see `get_stable_coloring()`).
+
+    Set `workers` to aggregate blocks of `chunk_size` rows in parallel, on a
+    pool of threads or processes (see `ChunkedAggregator`).
+
+    Set `block_size` to aggregate `block_size` rows at a time, and compress
+    every block to fixed-width integer keys right away (see
+    `rank_blocks()`), so that signatures of all pairs are never alive at
+    once in refinement rounds. Colors are stored
+    as `np.int32` whenever they fit.
+
+    Set `symmetric=True` to aggregate colors only for pairs (u, v) with
+    u <= v, if the graph is undirected and the method is transpose-closed
+    (see `is_transpose_closed()`); other methods are refused. Once almost
+    all pairs have distinct colors, rounds aggregate all pairs again (see
+    `symmetric_pays()`).
     """
-    def __init__(self):
+    operators: Tuple[str, ...] = ()
+    pooling: Literal['all', 'vs', 'sv'] = 'all'
+
+    def __init__(self, engine: Literal['loop', 'fused'] = 'fused',
+                 incremental: bool = False, workers: int = 1,
+                 chunk_size: Optional[int] = None,
+                 pool: Literal['thread', 'process'] = 'process',
+                 block_size: Optional[int] = None, symmetric: bool = False):
         super().__init__()
+        if symmetric and not self.is_transpose_closed():
+            raise RuntimeError(
+                f"{type(self).__name__} has an asymmetric update rule!"
+            )
+        self.engine = engine
+        self.incremental = incremental
+        self.block_size = block_size
+        self.symmetric = symmetric
+        self.active_pairs: Optional[np.ndarray] = None
+        self.kernel = SignatureKernel(self.operators)
+        self.parallel: Optional[ChunkedAggregator] = None
+        if workers > 1:
+            self.parallel = ChunkedAggregator(workers, chunk_size, pool)
+
+    def set_graph(self, graph,
+                  format: Literal['adj', 'dense', 'sparse'] = 'adj'):
+        """
+        Also index N(u) | N(v) for all pairs (u, v) once, if the method
+        uses `local_uv_fwl2`.
+        """
+        super().set_graph(graph, format)
+        self.union_graph: Optional[CSRAdj] = None
+        if 'local_uv_fwl2' in self.operators:
+            self.union_graph = self.graph.pair_union()
+
+    @classmethod
+    def is_transpose_closed(cls) -> bool:
+        """
+        Whether the transposes of the operators are operators of the method,
+        too. Then, on undirected graphs, the color of (v, u) is a function
+        of the color of (u, v) in every round.
+        """
+        return {TRANSPOSED_OPERATOR.get(op) for op in cls.operators} == \
+            set(cls.operators)
 
     def to2d(self, A: np.ndarray) -> np.ndarray:
         return A.reshape((self.graph.num_nodes, self.graph.num_nodes))
@@ -20,26 +108,257 @@ class WL2Base(BaseWL):
         """
         Set `identity=True` if one wants identity marking.
         """
-        self.color = np.zeros((self.graph.num_nodes, self.graph.num_nodes),
-                              dtype=object)
         dense_adj = self.graph.to_dense_adj()
-        for i in range(self.graph.num_nodes):
-            for j in range(self.graph.num_nodes):
-                color_ij = [dense_adj[i, j]]
-                if identity:
-                    color_ij.append(i == j)
-                if precolor is not None:
-                    color_ij += [precolor[i], precolor[j]]
-                self.color[i, j] = tuple(color_ij)
+        if self.symmetric:
+            if not np.array_equal(dense_adj, dense_adj.T):
+                raise RuntimeError('Symmetric mode needs an undirected graph!')
+            u, v = np.triu_indices(self.graph.num_nodes)
+            self.upper_pairs = u * self.graph.num_nodes + v
+        color_ij = [dense_adj]
+        if identity:
+            color_ij.append(np.eye(self.graph.num_nodes, dtype=np.int64))
+        if precolor is not None:
+            precolor = np.asarray(precolor, dtype=np.int64)
+            color_ij += [np.broadcast_to(precolor[:, None], dense_adj.shape),
+                         np.broadcast_to(precolor[None, :], dense_adj.shape)]
         
-        self.color = self.color.reshape(-1)
-        self.color = (rankdata(self.color, method='dense') - 1).astype(np.int64)
+        self.color = compact(self.relabel(
+            np.stack([color.reshape(-1) for color in color_ij], axis=1)
+        ))
+
+    def update_colors(self):
+        if self.symmetric and self.symmetric_pays():
+            self.color = compact(self.relabel_symmetric())
+        else:
+            self.color = compact(self.relabel_aggregate(self.relabel))
+
+    def symmetric_pays(self) -> bool:
+        """
+        Whether a symmetric round is expected to aggregate fewer pairs than
+        a full round. It aggregates the n(n + 1) / 2 upper pairs, and then
+        two pairs per class of upper pairs, whose number is at least half
+        the current number of colors. Once colors approach n(n - 1) / 2,
+        rounds aggregate all pairs instead.
+        """
+        num_nodes = self.graph.num_nodes
+        num_colors = int(self.color.max(initial=-1)) + 1
+        return num_colors < num_nodes * (num_nodes - 1) // 2
+
+    def relabel_symmetric(self) -> np.ndarray:
+        """
+        Relabel the aggregated colors of all pairs, computing them only for
+        the pairs (u, v) with u <= v. These are first partitioned into
+        classes of equal aggregated colors, which the transposed pairs
+        mirror. Then one pair per class and its transpose are relabeled
+        together, which yields the labels of all classes and of their
+        transposes, exactly as if all pairs had been relabeled.
+        """
+        num_nodes = self.graph.num_nodes
+        upper = self.upper_pairs
+        self.active_pairs = upper
+        classes = self.relabel_aggregate(dense_rank)
+        _, first = np.unique(classes, return_index=True)
+        u, v = np.divmod(upper[first], num_nodes)
+        self.active_pairs = np.concatenate([u * num_nodes + v,
+                                            v * num_nodes + u])
+        labels = self.relabel_aggregate(self.relabel)
+        self.active_pairs = None
+
+        u, v = np.divmod(upper, num_nodes)
+        color = np.zeros((num_nodes ** 2, ), dtype=labels.dtype)
+        color[upper] = labels[:first.shape[0]][classes]
+        color[v * num_nodes + u] = labels[first.shape[0]:][classes]
+        return color
+
+    def aggregate_symmetric(self) -> np.ndarray:
+        """
+        Return the exact aggregated colors of all pairs, computing them like
+        `relabel_symmetric()`.
+        """
+        num_nodes = self.graph.num_nodes
+        upper = self.upper_pairs
+        self.active_pairs = upper
+        signatures = as_hashable(self.aggregate_colors(exact=True))
+        classes = dense_rank(signatures)
+        _, first = np.unique(classes, return_index=True)
+        u, v = np.divmod(upper[first], num_nodes)
+        self.active_pairs = v * num_nodes + u
+        transposed = as_hashable(self.aggregate_colors(exact=True))
+        self.active_pairs = None
+
+        u, v = np.divmod(upper, num_nodes)
+        color_list = np.zeros((num_nodes ** 2, ), dtype=object)
+        color_list[v * num_nodes + u] = transposed[classes]
+        color_list[upper] = signatures
+        return color_list
+
+    def relabel_aggregate(self, relabel: Callable[[np.ndarray], np.ndarray]
+                          ) -> np.ndarray:
+        """
+        Relabel the aggregated colors by `relabel`. With `block_size`, dense
+        ranks are computed by `rank_blocks()`; other relabeling rules, which
+        label signatures one by one, label every block as it is computed.
+        """
+        if self.block_size is None:
+            return self.profiled('relabel', relabel, self.aggregate_colors())
+        if relabel is dense_rank:
+            return self.rank_blocks()
+        return np.concatenate(
+            [self.profiled('relabel', relabel, signatures)
+             for signatures in self.iter_blocks(self.pairs())]
+            + [np.zeros((0, ), dtype=np.int64)]
+        )
+
+    def rank_blocks(self) -> np.ndarray:
+        """
+        Return the dense ranks of the exact signatures of `self.pairs()`,
+        aggregated `block_size` rows at a time, such that only integers per
+        pair and the signatures of one block are alive at once.
+
+        Every signature is replaced by a fixed-width key as soon as its
+        block is computed: integer signatures are their own keys, others
+        are keyed by the old color of the pair and the 128-bit BLAKE2b
+        digest of `encode(signature)`. Ranking these keys partitions the
+        pairs, with parts ordered by old color. Then the parts of every old
+        color which splits are ordered by their signatures, recomputed for
+        one pair per part, a batch of old colors at a time. Since signatures
+        start with the old color (see `pointwise_uv`), this gives the ranks
+        of the signatures themselves.
+        """
+        pairs = self.pairs()
+        keys = [np.zeros((0, 2), dtype=np.int64)]
+        digested = False
+        for signatures in self.iter_blocks(pairs):
+            if signatures.dtype != object:
+                keys.append(signatures.reshape(signatures.shape[0], -1)
+                            .astype(np.int64))
+                continue
+            digested = True
+            table = {}
+            digests = np.zeros((signatures.shape[0], 2), dtype=np.int64)
+            for (i, sig) in enumerate(signatures):
+                if sig not in table:
+                    table[sig] = np.frombuffer(
+                        blake2b(encode(sig), digest_size=16).digest(),
+                        dtype=np.int64
+                    )
+                digests[i] = table[sig]
+            keys.append(digests)
+        if not digested:
+            return self.profiled('relabel', dense_rank,
+                                 np.concatenate(keys[1:] or keys[:1]))
+
+        old_color = self.color[pairs].astype(np.int64)
+        parts = self.profiled('relabel', dense_rank, np.column_stack(
+            [old_color, np.concatenate(keys)]
+        ))
+        num_parts = int(parts.max(initial=-1)) + 1
+        part_pair = np.zeros((num_parts, ), dtype=np.int64)
+        part_pair[parts] = np.arange(pairs.shape[0])
+        part_color = old_color[part_pair]
+        split = np.flatnonzero(
+            np.bincount(part_color)[part_color] > 1
+        )
+        order = np.zeros((num_parts, ), dtype=np.int64)
+        step = max(1, self.block_size * self.graph.num_nodes)
+        active_pairs = self.active_pairs
+        try:
+            start = 0
+            while start < split.shape[0]:
+                # Batches end between old colors.
+                end = int(np.searchsorted(
+                    part_color[split],
+                    part_color[split[min(start + step, split.shape[0]) - 1]],
+                    side='right'
+                ))
+                self.active_pairs = pairs[part_pair[split[start:end]]]
+                order[split[start:end]] = dense_rank(
+                    as_hashable(self.aggregate_block(exact=True))
+                )
+                start = end
+        finally:
+            self.active_pairs = active_pairs
+        return dense_rank(np.column_stack([part_color, order]))[parts]
+
+    def aggregate_colors(self, exact: bool = False):
+        """
+        Set `exact=True` to get signatures which are comparable with those
+        of other solvers (see `SignatureKernel`), e.g. for pooling. They are
+        always exact unless colors are dense ranks.
+        """
+        if self.block_size is not None:
+            ids, keys = self.aggregate_blocks()
+            return keys[ids]
+        if self.parallel is not None:
+            return self.parallel(self)
+        return self.aggregate_block(exact)
+
+    def aggregate_blocks(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Aggregate exact signatures `block_size` rows at a time, replacing
+        every block by ids into a table of distinct signatures as soon as it
+        is computed. Returns `(ids, keys)`, where `keys` is the `object`-array
+        of distinct signatures in order of first appearance, so that
+        `keys[ids]` are the aggregated colors. This is used for the exact
+        signatures of the final aggregation, which share equal signatures.
+        """
+        pairs = self.pairs()
+        table = {}
+        ids = np.zeros((pairs.shape[0], ), dtype=np.int64)
+        start = 0
+        for signatures in self.iter_blocks(pairs):
+            signatures = as_hashable(signatures)
+            ids[start:start + signatures.shape[0]] = np.fromiter(
+                (table.setdefault(sig, len(table)) for sig in signatures),
+                dtype=np.int64, count=signatures.shape[0]
+            )
+            start += signatures.shape[0]
+        keys = np.empty((len(table), ), dtype=object)
+        keys[:] = list(table)
+        return ids, keys
+
+    def iter_blocks(self, pairs: np.ndarray) -> Iterator[np.ndarray]:
+        """
+        Yield the exact signatures of `pairs`, `block_size` rows at a time.
+        """
+        if self.parallel is not None:
+            yield from self.parallel.imap(self)
+            return
+        step = max(1, self.block_size * self.graph.num_nodes)
+        active_pairs = self.active_pairs
+        try:
+            for i in range(0, pairs.shape[0], step):
+                self.active_pairs = pairs[i:i + step]
+                yield self.aggregate_block(exact=True)
+        finally:
+            self.active_pairs = active_pairs
 
-    def aggregate_colors(self):
-        raise NotImplementedError()
+    def aggregate_block(self, exact: bool = False):
+        """
+        Aggregate colors of `self.pairs()` in one go.
+        """
+        if self.engine != 'loop':
+            return self.kernel(self, exact or self.relabel is not dense_rank)
+        colors = [self.get_operator(op)() for op in self.operators]
+        return self.profiled('color_concat', self.color_concat, *colors)
     
-    def pool_colors(self, coloring) -> MultiSet:
-        raise NotImplementedError()
+    def pool_colors(self, coloring) -> Union[ArrayMultiSet, RowMultiSet]:
+        return getattr(self, 'pool_' + self.pooling)(coloring)
+
+    def get_operator(self, name: str) -> Callable[[], np.ndarray]:
+        operator = getattr(self, name)
+        if self.profile is None:
+            return operator
+        return lambda: self.profiled(name, operator)
+
+    def pairs(self) -> np.ndarray:
+        """
+        Return the flat indices of the pairs (u, v) to aggregate colors for.
+        These are all pairs, unless `self.active_pairs` is set.
+        """
+        if self.active_pairs is None:
+            return np.arange(self.graph.num_nodes ** 2, dtype=np.int64)
+        return self.active_pairs
     
     """
     Below, we implement all operations defined in the paper "A Complete 
@@ -51,199 +370,374 @@ class WL2Base(BaseWL):
         \sum_(w \in V) h(u, w) -> h(u, v)
         """
         old_color = self.to2d(self.color)
-        color_list = np.zeros((self.graph.num_nodes, self.graph.num_nodes),
-                              dtype=object)
-        for node in range(self.graph.num_nodes):
-            for _ in range(self.graph.num_nodes):
-                color_list[node, _] = tuple(np.sort(old_color[node, :]))
+        pairs = self.pairs()
+        color_list = np.zeros((pairs.shape[0], ), dtype=object)
+        for idx, pair in enumerate(pairs):
+            node = pair // self.graph.num_nodes
+            color_list[idx] = tuple(np.sort(old_color[node, :]))
         
-        return color_list.reshape(-1)
+        return color_list
     
     def global_v(self) -> np.ndarray:
         """
         \sum_(w \in V) h(w, v) -> h(u, v)
         """
         old_color = self.to2d(self.color)
-        color_list = np.zeros((self.graph.num_nodes, self.graph.num_nodes),
-                              dtype=object)
-        for _ in range(self.graph.num_nodes):
-            for node in range(self.graph.num_nodes):
-                color_list[_, node] = tuple(np.sort(old_color[:, node]))
+        pairs = self.pairs()
+        color_list = np.zeros((pairs.shape[0], ), dtype=object)
+        for idx, pair in enumerate(pairs):
+            node = pair % self.graph.num_nodes
+            color_list[idx] = tuple(np.sort(old_color[:, node]))
         
-        return color_list.reshape(-1)
+        return color_list
     
     def local_u(self) -> np.ndarray:
         """
         \sum_(w \in N(v)) h(u, w) -> h(u, v)
         """
         old_color = self.to2d(self.color)
-        color_list = np.zeros((self.graph.num_nodes, self.graph.num_nodes),
-                              dtype=object)
-        for node in range(self.graph.num_nodes):
-            for central in range(self.graph.num_nodes):
-                color_list[node, central] = tuple(
-                    np.sort(old_color[node, list(self.graph.adj_dict[central])])
-                )
+        pairs = self.pairs()
+        color_list = np.zeros((pairs.shape[0], ), dtype=object)
+        for idx, pair in enumerate(pairs):
+            node, central = divmod(pair, self.graph.num_nodes)
+            color_list[idx] = tuple(
+                np.sort(old_color[node, self.graph.neighbors(central)])
+            )
         
-        return color_list.reshape(-1)
+        return color_list
     
     def local_v(self) -> np.ndarray:
         """
         \sum_(w \in N(u)) h(w, v) -> h(u, v)
         """
         old_color = self.to2d(self.color)
-        color_list = np.zeros((self.graph.num_nodes, self.graph.num_nodes),
-                              dtype=object)
-        for central in range(self.graph.num_nodes):
-            for node in range(self.graph.num_nodes):
-                color_list[central, node] = tuple(
-                    np.sort(old_color[list(self.graph.adj_dict[central]), node])
-                )
+        pairs = self.pairs()
+        color_list = np.zeros((pairs.shape[0], ), dtype=object)
+        for idx, pair in enumerate(pairs):
+            central, node = divmod(pair, self.graph.num_nodes)
+            color_list[idx] = tuple(
+                np.sort(old_color[self.graph.neighbors(central), node])
+            )
         
-        return color_list.reshape(-1)
+        return color_list
     
     def pointwise_uv(self) -> np.ndarray:
         """
         h(u, v) -> h(u, v)
         """
-        return self.color.astype(object)
+        return self.color[self.pairs()]
     
     def pointwise_vu(self) -> np.ndarray:
         """
         h(v, u) -> h(u, v)
         """
-        return self.to2d(self.color).T.reshape(-1).astype(object)
+        return self.to2d(self.color).T.reshape(-1)[self.pairs()]
     
     def pointwise_uu(self) -> np.ndarray:
         """
         h(u, u) -> h(u, v)
         """
         old_color = self.to2d(self.color)
-        return np.broadcast_to(np.diagonal(old_color)[:, None],
-                               old_color.shape).reshape(-1).astype(object)
+        return np.diagonal(old_color)[self.pairs() // self.graph.num_nodes]
     
     def pointwise_vv(self) -> np.ndarray:
         """
         h(v, v) -> h(u, v)
         """
         old_color = self.to2d(self.color)
-        return np.broadcast_to(np.diagonal(old_color)[None, :],
-                               old_color.shape).reshape(-1).astype(object)
+        return np.diagonal(old_color)[self.pairs() % self.graph.num_nodes]
     
     def global_fwl2(self) -> np.ndarray:
         """
         \sum_(w \in V) (h(u, w), h(w, v)) -> h(u, v)
         """
-        color_list = np.zeros((self.graph.num_nodes, self.graph.num_nodes),
-                              dtype=object)
+        pairs = self.pairs()
+        color_list = np.zeros((pairs.shape[0], ), dtype=object)
+        old_color = self.to2d(self.color)
+
+        for idx, pair in enumerate(pairs):
+            i, j = divmod(pair, self.graph.num_nodes)
+            color_ij = np.zeros((self.graph.num_nodes, ), dtype=object)
+            for k in range(self.graph.num_nodes):
+                color_ij[k] = (old_color[i, k], old_color[k, j])
+            color_list[idx] = tuple(np.sort(color_ij))
+
+        return color_list
+    
+    def global_fwl2_matmul(self, num_hashes: int = 4) -> np.ndarray:
+        """
+        \sum_(w \in V) (h(u, w), h(w, v)) -> h(u, v), computed by dense
+        matrix products.
+
+        Every color c is given two pseudo-random integer weights r(c) and
+        s(c), so that \sum_w r(h(u, w)) * s(h(w, v)) is the (u, v) entry of
+        the product r(h) @ s(h). The weights are small enough for the float
+        product to be exact, and `num_hashes` independent products are
+        taken, so that distinct multisets collide with negligible
+        probability. Returns a (number of pairs) * `num_hashes` integer
+        array.
+        """
         old_color = self.to2d(self.color)
+        pairs = self.pairs()
+        bits = np.uint64(64 - (53 - int(self.graph.num_nodes).bit_length()) // 2)
 
-        for i in range(self.graph.num_nodes):
-            for j in range(self.graph.num_nodes):
-                color_ij = np.zeros((self.graph.num_nodes, ), dtype=object)
-                for k in range(self.graph.num_nodes):
-                    color_ij[k] = (old_color[i, k], old_color[k, j])
-                color_list[i, j] = tuple(np.sort(color_ij))
+        # Only the rows of the product which contain some pair are computed.
+        rows, row_index = np.unique(pairs // self.graph.num_nodes,
+                                    return_inverse=True)
+        cols = pairs % self.graph.num_nodes
+        color_list = np.zeros((pairs.shape[0], num_hashes), dtype=np.int64)
+        for k in range(num_hashes):
+            R = (mix64(old_color[rows], 2 * k) >> bits).astype(np.float64)
+            S = (mix64(old_color, 2 * k + 1) >> bits).astype(np.float64)
+            color_list[:, k] = (R @ S)[row_index.reshape(-1), cols]
 
-        return color_list.reshape(-1)
+        return color_list
     
     def local_u_fwl2(self) -> np.ndarray:
         """
         \sum_(w \in N(u)) (h(u, w), h(w, v)) -> h(u, v)
         """
-        color_list = np.zeros((self.graph.num_nodes, self.graph.num_nodes),
-                              dtype=object)
+        pairs = self.pairs()
+        color_list = np.zeros((pairs.shape[0], ), dtype=object)
         old_color = self.to2d(self.color)
         
-        for i in range(self.graph.num_nodes):
-            for j in range(self.graph.num_nodes):
-                adj_list = list(self.graph.adj_dict[i])
-                color_ij = np.zeros((len(adj_list), ), dtype=object)
-                for k_idx, k in enumerate(adj_list):
-                    color_ij[k_idx] = (old_color[i, k], old_color[k, j])
-                color_list[i, j] = tuple(np.sort(color_ij))
+        for idx, pair in enumerate(pairs):
+            i, j = divmod(pair, self.graph.num_nodes)
+            adj_list = self.graph.neighbors(i)
+            color_ij = np.zeros((len(adj_list), ), dtype=object)
+            for k_idx, k in enumerate(adj_list):
+                color_ij[k_idx] = (old_color[i, k], old_color[k, j])
+            color_list[idx] = tuple(np.sort(color_ij))
 
-        return color_list.reshape(-1)
+        return color_list
     
     def local_v_fwl2(self) -> np.ndarray:
         """
         \sum_(w \in N(v)) (h(u, w), h(w, v)) -> h(u, v)
         """
-        color_list = np.zeros((self.graph.num_nodes, self.graph.num_nodes),
-                              dtype=object)
+        pairs = self.pairs()
+        color_list = np.zeros((pairs.shape[0], ), dtype=object)
         old_color = self.to2d(self.color)
 
-        for i in range(self.graph.num_nodes):
-            for j in range(self.graph.num_nodes):
-                adj_list = list(self.graph.adj_dict[j])
-                color_ij = np.zeros((len(adj_list), ), dtype=object)
-                for k_idx, k in enumerate(adj_list):
-                    color_ij[k_idx] = (old_color[i, k], old_color[k, j])
-                color_list[i, j] = tuple(np.sort(color_ij))
+        for idx, pair in enumerate(pairs):
+            i, j = divmod(pair, self.graph.num_nodes)
+            adj_list = self.graph.neighbors(j)
+            color_ij = np.zeros((len(adj_list), ), dtype=object)
+            for k_idx, k in enumerate(adj_list):
+                color_ij[k_idx] = (old_color[i, k], old_color[k, j])
+            color_list[idx] = tuple(np.sort(color_ij))
 
-        return color_list.reshape(-1)
+        return color_list
     
     def local_uv_fwl2(self) -> np.ndarray:
         """
         \sum_(w \in N(u) or N(v)) (h(u, w), h(w, v)) -> h(u, v)
         """
-        color_list = np.zeros((self.graph.num_nodes, self.graph.num_nodes),
-                              dtype=object)
+        pairs = self.pairs()
+        color_list = np.zeros((pairs.shape[0], ), dtype=object)
         old_color = self.to2d(self.color)
 
-        for i in range(self.graph.num_nodes):
-            for j in range(self.graph.num_nodes):
-                adj_list = list(self.graph.adj_dict[i] | self.graph.adj_dict[j])
-                color_ij = np.zeros((len(adj_list), ), dtype=object)
-                for k_idx, k in enumerate(adj_list):
-                    color_ij[k_idx] = (old_color[i, k], old_color[k, j])
-                color_list[i, j] = tuple(np.sort(color_ij))
+        for idx, pair in enumerate(pairs):
+            i, j = divmod(pair, self.graph.num_nodes)
+            adj_list = self.union_graph.neighbors(pair)
+            color_ij = np.zeros((len(adj_list), ), dtype=object)
+            for k_idx, k in enumerate(adj_list):
+                color_ij[k_idx] = (old_color[i, k], old_color[k, j])
+            color_list[idx] = tuple(np.sort(color_ij))
 
-        return color_list.reshape(-1)
+        return color_list
     
     def n2_fwl2(self) -> np.ndarray:
         """
         \sum_(w \in N(v), z \in N(u)) (h(u, w), h(w, v), h(u, z), h(z, v), h(w, z)) -> h(u, v)
         """
-        color_list = np.zeros((self.graph.num_nodes, self.graph.num_nodes),
-                              dtype=object)
+        pairs = self.pairs()
+        color_list = np.zeros((pairs.shape[0], ), dtype=object)
         old_color = self.to2d(self.color)
 
-        for i in range(self.graph.num_nodes):
-            for j in range(self.graph.num_nodes):
-                adj_list_w = list(self.graph.adj_dict[j])
-                adj_list_z = list(self.graph.adj_dict[i])
-                color_ij = np.zeros((len(adj_list_w) * len(adj_list_z), ), dtype=object)
-                for k_idx, (w, z) in enumerate(product(adj_list_w, adj_list_z)):
-                    color_ij[k_idx] = (old_color[i, w], old_color[w, j],
-                                       old_color[i, z], old_color[z, j],
-                                       old_color[w, z])
-                color_list[i, j] = tuple(np.sort(color_ij))
+        for idx, pair in enumerate(pairs):
+            i, j = divmod(pair, self.graph.num_nodes)
+            adj_list_w = self.graph.neighbors(j)
+            adj_list_z = self.graph.neighbors(i)
+            color_ij = np.zeros((len(adj_list_w) * len(adj_list_z), ), dtype=object)
+            for k_idx, (w, z) in enumerate(product(adj_list_w, adj_list_z)):
+                color_ij[k_idx] = (old_color[i, w], old_color[w, j],
+                                   old_color[i, z], old_color[z, j],
+                                   old_color[w, z])
+            color_list[idx] = tuple(np.sort(color_ij))
+
+        return color_list
+
+    """
+    Below, for every operation, we give the pairs whose aggregated color may
+    change, given the pairs (x, y) whose color class was split in the
+    previous round. Dirtiness spreads along in-neighbors: x' with x in N(x').
+    """
+    def dirty_pairs(self, changed: np.ndarray) -> np.ndarray:
+        num_nodes = self.graph.num_nodes
+        x, y = np.divmod(np.flatnonzero(changed), num_nodes)
+        reverse = self.graph.reverse()
+        dirty = np.zeros((num_nodes, num_nodes), dtype=bool)
+
+        def spread(owner_side: np.ndarray, centrals: np.ndarray,
+                   transpose: bool):
+            # (owner_side, w) for w with central in N(w), or the transpose.
+            owner, nbrs = reverse.gather(centrals)
+            if transpose:
+                dirty[nbrs, owner_side[owner]] = True
+            else:
+                dirty[owner_side[owner], nbrs] = True
+
+        def neighbor_product(first: np.ndarray, second: np.ndarray):
+            # (a, b) for a with first in N(a) and b with second in N(b).
+            deg_a, deg_b = reverse.degree[first], reverse.degree[second]
+            sizes = deg_a * deg_b
+            owner = np.repeat(np.arange(sizes.shape[0], dtype=np.int64),
+                              sizes)
+            index = np.arange(owner.shape[0]) - \
+                np.repeat(np.cumsum(sizes) - sizes, sizes)
+            a_index, b_index = np.divmod(index, deg_b[owner])
+            dirty[reverse.indices[reverse.indptr[first][owner] + a_index],
+                  reverse.indices[reverse.indptr[second][owner] + b_index]] \
+                = True
+
+        def mark(u, v):
+            dirty[u, v] = True
+
+        every = slice(None)
+        diag = x[x == y]
+        rules = {
+            'pointwise_uv': lambda: mark(x, y),
+            'pointwise_vu': lambda: mark(y, x),
+            'pointwise_uu': lambda: mark(diag, every),
+            'pointwise_vv': lambda: mark(every, diag),
+            'global_u': lambda: mark(x, every),
+            'global_v': lambda: mark(every, y),
+            'local_u': lambda: spread(x, y, False),
+            'local_v': lambda: spread(y, x, True),
+            # Rows (columns) of changed pairs (u, w) ((w, v)), w in N(u)
+            # (N(v)).
+            'edge_rows': lambda: mark(x[self.graph.has_edges(x, y)], every),
+            'edge_cols': lambda: mark(every, y[self.graph.has_edges(y, x)]),
+            'neighbor_pairs': lambda: neighbor_product(y, x),
+        }
+        composite = {
+            'global_fwl2': ('global_u', 'global_v'),
+            'local_u_fwl2': ('edge_rows', 'local_v'),
+            'local_v_fwl2': ('local_u', 'edge_cols'),
+            'local_uv_fwl2': ('edge_rows', 'local_v', 'local_u', 'edge_cols'),
+            'n2_fwl2': ('edge_rows', 'local_v', 'local_u', 'edge_cols',
+                        'neighbor_pairs'),
+        }
+        for op in self.operators:
+            for rule in composite.get(op, (op, )):
+                rules[rule]()
+        return dirty.reshape(-1)
+
+    def update_colors_incremental(self, changed: np.ndarray) -> np.ndarray:
+        """
+        Update colors like `update_colors()`, given the boolean array
+        `changed` of pairs whose color class split in the previous round.
+        Returns the pairs whose color class splits in this round.
+
+        Pairs whose inputs did not change and which share a color keep
+        sharing an aggregated color, so only the dirty pairs and one clean
+        representative per affected class are recomputed. Since aggregated
+        colors start with the old color, the dense ranks of all pairs follow
+        class by class.
+        """
+        old_color = self.color
+        num_classes = int(old_color.max()) + 1
+        dirty = self.dirty_pairs(changed)
+        touched = np.zeros((num_classes, ), dtype=bool)
+        touched[old_color[dirty]] = True
+        clean = np.flatnonzero(~dirty & touched[old_color])
+        _, first = np.unique(old_color[clean], return_index=True)
+        dirty, rep = np.flatnonzero(dirty), clean[first]
 
-        return color_list.reshape(-1)
+        self.active_pairs = np.concatenate([dirty, rep])
+        parts = self.relabel_aggregate(dense_rank)
+        self.active_pairs = None
+
+        # Parts are numbered class by class, in order of aggregated colors.
+        part_class = np.zeros((int(parts.max(initial=-1)) + 1, ),
+                              dtype=np.int64)
+        part_class[parts] = old_color[np.concatenate([dirty, rep])]
+        part_index = np.arange(part_class.shape[0]) - \
+            np.searchsorted(part_class, part_class)
+        num_parts = np.where(touched, 0, 1)
+        np.add.at(num_parts, part_class, 1)
+        base = np.cumsum(num_parts) - num_parts
+
+        rep_index = np.zeros((num_classes, ), dtype=np.int64)
+        rep_index[old_color[rep]] = part_index[parts[dirty.shape[0]:]]
+        color = base[old_color]
+        color[clean] += rep_index[old_color[clean]]
+        color[dirty] = base[old_color[dirty]] + \
+            part_index[parts[:dirty.shape[0]]]
+        self.color = compact(color)
+        return num_parts[old_color] > 1
+
+    def get_stable_coloring(self):
+        """
+        Incremental rounds rely on dense ranks, and are not used with other
+        relabeling rules, nor in symmetric mode. Parallel workers release
+        the graph when done.
+        """
+        try:
+            if not self.incremental or self.relabel is not dense_rank \
+                    or self.symmetric:
+                while not self.update_colors_test_stable(): pass
+            else:
+                changed = np.ones(self.color.shape, dtype=bool)
+                while np.any(changed):
+                    changed = self.track_round(
+                        lambda: self.update_colors_incremental(changed)
+                    )
+            if self.symmetric and self.symmetric_pays():
+                return self.profiled('final_aggregate',
+                                     self.aggregate_symmetric)
+            return self.profiled('final_aggregate', self.aggregate_colors,
+                                 exact=True)
+        finally:
+            if self.parallel is not None:
+                self.parallel.release()
 
     def color_concat(self, *colors) -> np.ndarray:
         """
-        Concat multiple colors into one.
+        Concat multiple colors into one. If all colors are integer arrays,
+        they are stacked into a 2D integer array (one signature per row).
         """
-        color_list = np.zeros((self.graph.num_nodes ** 2, ), dtype=object)
+        if all(color.dtype != object for color in colors):
+            return np.column_stack(colors).astype(np.int64)
+
+        color_list = np.zeros((colors[0].shape[0], ), dtype=object)
 
-        for i in range(self.graph.num_nodes ** 2):
+        for i in range(colors[0].shape[0]):
             color_list[i] = tuple((color[i] for color in colors))
         
         return color_list
     
-    def pool_vs(self, coloring) -> MultiSet:
-        return MultiSet.from_iterable(
-            (FrozenMultiSet.from_iterable(row) for row in self.to2d(coloring))
-        )
+    def pool_vs(self, coloring) -> RowMultiSet:
+        return RowMultiSet.from_matrix(coloring, self.graph.num_nodes)
     
-    def pool_sv(self, coloring) -> MultiSet:
-        return MultiSet.from_iterable(
-            (FrozenMultiSet.from_iterable(row) for row in self.to2d(coloring).T)
-        )
+    def pool_sv(self, coloring) -> RowMultiSet:
+        return RowMultiSet.from_matrix(coloring, self.graph.num_nodes,
+                                       transpose=True)
     
-    def pool_all(self, coloring) -> MultiSet:
-        return MultiSet.from_iterable(coloring)
+    def pool_all(self, coloring) -> ArrayMultiSet:
+        return ArrayMultiSet.from_array(coloring)
     
-        
\ No newline at end of file
+        
+
+def define_method(name: str, operators: Tuple[str, ...],
+                  pooling: Literal['all', 'vs', 'sv']) -> type:
+    """
+    Define and register a `WL2Base` method from its operators and pooling,
+    e.g. `define_method('SSWL_G', ('pointwise_uv', 'local_u', 'local_v',
+    'global_u'), 'sv')`.
+    """
+    assert operators and operators[0] == 'pointwise_uv', \
+        "The first operator must be pointwise_uv!"
+    return register(type(name, (WL2Base, ), {'operators': tuple(operators),
+                                             'pooling': pooling}))
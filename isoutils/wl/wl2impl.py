@@ -1,230 +1,227 @@
-from ..utils import MultiSet
+from .base import register
 from .wl2base import WL2Base
+from typing import Literal, Optional
 
+@register
 class WL2(WL2Base):
-    def aggregate_colors(self):
-        return self.color_concat(
-            self.color,
-            self.global_u(),
-            self.global_v(),
-        )
-    def pool_colors(self, coloring) -> MultiSet:
-        return self.pool_all(coloring)
+    operators = (
+        'pointwise_uv',
+        'global_u',
+        'global_v',
+    )
+    pooling = 'all'
 
+@register
 class FWL2(WL2Base):
-    def aggregate_colors(self):
-        return self.color_concat(
-            self.color,
-            self.global_fwl2(),
-        )
-    def pool_colors(self, coloring) -> MultiSet:
-        return self.pool_all(coloring)
-    
+    """
+    Set `engine='matmul'` to aggregate colors by dense matrix products
+    (see `global_fwl2_matmul()`) instead of Python loops. The pointwise
+    operator is fused as with `engine='fused'`.
+    """
+    operators = (
+        'pointwise_uv',
+        'global_fwl2',
+    )
+    pooling = 'all'
+
+    def __init__(self, engine: Literal['loop', 'fused', 'matmul'] = 'fused',
+                 incremental: bool = False, workers: int = 1,
+                 chunk_size: Optional[int] = None,
+                 pool: Literal['thread', 'process'] = 'process',
+                 block_size: Optional[int] = None, symmetric: bool = False):
+        super().__init__(engine, incremental, workers, chunk_size, pool,
+                         block_size, symmetric)
+
+    def get_operator(self, name: str):
+        if name == 'global_fwl2' and self.engine == 'matmul':
+            name = 'global_fwl2_matmul'
+        return super().get_operator(name)
+
+@register
 class N2FWL(WL2Base):
-    def aggregate_colors(self):
-        return self.color_concat(
-            self.color,
-            self.n2_fwl2(),
-        )
-    def pool_colors(self, coloring) -> MultiSet:
-        return self.pool_all(coloring)
-    
+    operators = (
+        'pointwise_uv',
+        'n2_fwl2',
+    )
+    pooling = 'all'
+
+@register
 class LFWL(WL2Base):
-    def aggregate_colors(self):
-        return self.color_concat(
-            self.color,
-            self.local_v_fwl2(),
-        )
-    def pool_colors(self, coloring) -> MultiSet:
-        return self.pool_all(coloring)
-    
+    operators = (
+        'pointwise_uv',
+        'local_v_fwl2',
+    )
+    pooling = 'all'
+
+@register
 class SLFWL(WL2Base):
-    def aggregate_colors(self):
-        return self.color_concat(
-            self.color,
-            self.local_uv_fwl2(),
-        )
-    def pool_colors(self, coloring) -> MultiSet:
-        return self.pool_all(coloring)
-    
+    operators = (
+        'pointwise_uv',
+        'local_uv_fwl2',
+    )
+    pooling = 'all'
+
+@register
 class SWL_SV(WL2Base):
-    def aggregate_colors(self):
-        return self.color_concat(
-            self.pointwise_uv(),
-            self.local_u(),
-        )
-    def pool_colors(self, coloring) -> MultiSet:
-        return self.pool_sv(coloring)
-    
+    operators = (
+        'pointwise_uv',
+        'local_u',
+    )
+    pooling = 'sv'
+
+@register
 class SWL_VS(WL2Base):
-    def aggregate_colors(self):
-        return self.color_concat(
-            self.pointwise_uv(),
-            self.local_u(),
-        )
-    def pool_colors(self, coloring) -> MultiSet:
-        return self.pool_vs(coloring)
-    
+    operators = (
+        'pointwise_uv',
+        'local_u',
+    )
+    pooling = 'vs'
+
+@register
 class SWL_SV_P(WL2Base):
-    def aggregate_colors(self):
-        return self.color_concat(
-            self.pointwise_uv(),
-            self.local_u(),
-            self.pointwise_uu(),
-        )
-    def pool_colors(self, coloring) -> MultiSet:
-        return self.pool_sv(coloring)
-    
+    operators = (
+        'pointwise_uv',
+        'local_u',
+        'pointwise_uu',
+    )
+    pooling = 'sv'
+
+@register
 class SWL_VS_P(WL2Base):
-    def aggregate_colors(self):
-        return self.color_concat(
-            self.pointwise_uv(),
-            self.local_u(),
-            self.pointwise_uu(),
-        )
-    def pool_colors(self, coloring) -> MultiSet:
-        return self.pool_vs(coloring)
+    operators = (
+        'pointwise_uv',
+        'local_u',
+        'pointwise_uu',
+    )
+    pooling = 'vs'
 
+@register
 class SWL_SV_G(WL2Base):
-    def aggregate_colors(self):
-        return self.color_concat(
-            self.pointwise_uv(),
-            self.local_u(),
-            self.pointwise_uu(),
-            self.global_u(),
-        )
-    def pool_colors(self, coloring) -> MultiSet:
-        return self.pool_sv(coloring)
-    
+    operators = (
+        'pointwise_uv',
+        'local_u',
+        'pointwise_uu',
+        'global_u',
+    )
+    pooling = 'sv'
+
+@register
 class SWL_VS_G(WL2Base):
-    def aggregate_colors(self):
-        return self.color_concat(
-            self.pointwise_uv(),
-            self.local_u(),
-            self.pointwise_uu(),
-            self.global_u(),
-        )
-    def pool_colors(self, coloring) -> MultiSet:
-        return self.pool_vs(coloring)
-    
+    operators = (
+        'pointwise_uv',
+        'local_u',
+        'pointwise_uu',
+        'global_u',
+    )
+    pooling = 'vs'
+
+@register
 class PSWL_SV(WL2Base):
-    def aggregate_colors(self):
-        return self.color_concat(
-            self.pointwise_uv(),
-            self.local_u(),
-            self.pointwise_vv(),
-        )
-    def pool_colors(self, coloring) -> MultiSet:
-        return self.pool_sv(coloring)
-    
+    operators = (
+        'pointwise_uv',
+        'local_u',
+        'pointwise_vv',
+    )
+    pooling = 'sv'
+
+@register
 class PSWL_VS(WL2Base):
-    def aggregate_colors(self):
-        return self.color_concat(
-            self.pointwise_uv(),
-            self.local_u(),
-            self.pointwise_vv(),
-        )
-    def pool_colors(self, coloring) -> MultiSet:
-        return self.pool_vs(coloring)
-    
+    operators = (
+        'pointwise_uv',
+        'local_u',
+        'pointwise_vv',
+    )
+    pooling = 'vs'
+
+@register
 class GSWL_SV(WL2Base):
-    def aggregate_colors(self):
-        return self.color_concat(
-            self.pointwise_uv(),
-            self.local_u(),
-            self.global_v(),
-        )
-    def pool_colors(self, coloring) -> MultiSet:
-        return self.pool_sv(coloring)
-    
+    operators = (
+        'pointwise_uv',
+        'local_u',
+        'global_v',
+    )
+    pooling = 'sv'
+
+@register
 class GSWL_VS(WL2Base):
-    def aggregate_colors(self):
-        return self.color_concat(
-            self.pointwise_uv(),
-            self.local_u(),
-            self.global_v(),
-        )
-    def pool_colors(self, coloring) -> MultiSet:
-        return self.pool_vs(coloring)
-    
+    operators = (
+        'pointwise_uv',
+        'local_u',
+        'global_v',
+    )
+    pooling = 'vs'
+
+@register
 class GSWL_SV_P(WL2Base):
-    def aggregate_colors(self):
-        return self.color_concat(
-            self.pointwise_uv(),
-            self.local_u(),
-            self.global_v(),
-            self.pointwise_vv(),
-        )
-    def pool_colors(self, coloring) -> MultiSet:
-        return self.pool_sv(coloring)
-    
+    operators = (
+        'pointwise_uv',
+        'local_u',
+        'global_v',
+        'pointwise_vv',
+    )
+    pooling = 'sv'
+
+@register
 class GSWL_VS_P(WL2Base):
-    def aggregate_colors(self):
-        return self.color_concat(
-            self.pointwise_uv(),
-            self.local_u(),
-            self.global_v(),
-            self.pointwise_vv(),
-        )
-    def pool_colors(self, coloring) -> MultiSet:
-        return self.pool_vs(coloring)
-    
+    operators = (
+        'pointwise_uv',
+        'local_u',
+        'global_v',
+        'pointwise_vv',
+    )
+    pooling = 'vs'
+
+@register
 class GSWL_SV(WL2Base):
-    def aggregate_colors(self):
-        return self.color_concat(
-            self.pointwise_uv(),
-            self.local_u(),
-            self.global_v(),
-        )
-    def pool_colors(self, coloring) -> MultiSet:
-        return self.pool_sv(coloring)
-    
+    operators = (
+        'pointwise_uv',
+        'local_u',
+        'global_v',
+    )
+    pooling = 'sv'
+
+@register
 class SSWL_VS(WL2Base):
-    def aggregate_colors(self):
-        return self.color_concat(
-            self.pointwise_uv(),
-            self.local_u(),
-            self.local_v(),
-        )
-    def pool_colors(self, coloring) -> MultiSet:
-        return self.pool_vs(coloring)
-    
+    operators = (
+        'pointwise_uv',
+        'local_u',
+        'local_v',
+    )
+    pooling = 'vs'
+
+@register
 class SSWL_SV(WL2Base):
-    def aggregate_colors(self):
-        return self.color_concat(
-            self.pointwise_uv(),
-            self.local_u(),
-            self.local_v(),
-        )
-    def pool_colors(self, coloring) -> MultiSet:
-        return self.pool_sv(coloring)
+    operators = (
+        'pointwise_uv',
+        'local_u',
+        'local_v',
+    )
+    pooling = 'sv'
 
+@register
 class FullSWL_VS(WL2Base):
-    def aggregate_colors(self):
-        return self.color_concat(
-            self.pointwise_uv(),
-            self.pointwise_vu(),
-            self.pointwise_uu(),
-            self.pointwise_vv(),
-            self.global_u(),
-            self.global_v(),
-            self.local_u(),
-            self.local_v(),
-        )
-    def pool_colors(self, coloring) -> MultiSet:
-        return self.pool_vs(coloring)
-    
+    operators = (
+        'pointwise_uv',
+        'pointwise_vu',
+        'pointwise_uu',
+        'pointwise_vv',
+        'global_u',
+        'global_v',
+        'local_u',
+        'local_v',
+    )
+    pooling = 'vs'
+
+@register
 class FullSWL_SV(WL2Base):
-    def aggregate_colors(self):
-        return self.color_concat(
-            self.pointwise_uv(),
-            self.pointwise_vu(),
-            self.pointwise_uu(),
-            self.pointwise_vv(),
-            self.global_u(),
-            self.global_v(),
-            self.local_u(),
-            self.local_v(),
-        )
-    def pool_colors(self, coloring) -> MultiSet:
-        return self.pool_sv(coloring)
\ No newline at end of file
+    operators = (
+        'pointwise_uv',
+        'pointwise_vu',
+        'pointwise_uu',
+        'pointwise_vv',
+        'global_u',
+        'global_v',
+        'local_u',
+        'local_v',
+    )
+    pooling = 'sv'
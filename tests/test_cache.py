@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT = """
+import sys
+import numpy as np
+from isoutils.comparer import wl_test, wl_representation
+from isoutils.utils import RepresentationCache
+
+path, method, action = sys.argv[1:]
+G = np.array([[0, 1, 1, 2, 2, 3, 3, 0, 0, 4, 4, 1],
+              [1, 0, 2, 1, 3, 2, 0, 3, 4, 0, 1, 4]])
+H = np.array([3, 0, 4, 1, 2])[G]
+cache = RepresentationCache(path)
+if action == 'store':
+    wl_representation(method, G, cache=cache)
+else:
+    print(int(wl_test(method, G, H, cache=cache)))
+cache.close()
+"""
+
+def run(path: str, method: str, action: str, seed: str) -> str:
+    env = dict(os.environ, PYTHONHASHSEED=seed, PYTHONPATH=ROOT)
+    return subprocess.run([sys.executable, '-c', SCRIPT, path, method, action],
+                          env=env, capture_output=True, text=True,
+                          check=True).stdout.strip()
+
+@pytest.mark.parametrize('method', ['WL1', 'WL2', 'FWL2', 'SSWL_SV'])
+def test_cache_across_processes(method, tmp_path):
+    """
+    A representation cached by one process equals the one computed afresh
+    by another process, whose hash seed differs.
+    """
+    path = str(tmp_path / 'cache.sqlite')
+    run(path, method, 'store', '1')
+    assert run(path, method, 'test', '2') == '0'